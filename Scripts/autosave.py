@@ -0,0 +1,115 @@
+"""Atomic configuration saves on a background thread.
+
+The UI thread takes a cheap snapshot of the configuration (list copies, no
+serialization) and hands it to SaveWriter. The writer thread serializes it
+prompt by prompt, so big decks don't hold the interpreter for one long
+json.dump, and replaces the file atomically: the file on disk is always
+either the previous or the new version, never half written. Paths ending in
+.hkdeck are written in the binary deck format instead of JSON.
+"""
+import json
+import os
+import tempfile
+import threading
+
+import binarydeck
+
+
+def write_atomic(path, write, binary=False):
+    """Write a file through write(f) into a temporary file, then swap it in."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode)  # mkstemp files are private
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable (not possible on Windows)
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def dump_config(config, f):
+    """json.dump a configuration, one prompt per call."""
+    f.write('{"prompts": [')
+    for i, prompt in enumerate(config["prompts"]):
+        if i:
+            f.write(", ")
+        f.write(json.dumps(prompt))
+    rest = {key: value for key, value in config.items() if key != "prompts"}
+    f.write("], " + json.dumps(rest)[1:] if rest else "]}")
+
+
+class SaveWriter:
+    """Background thread writing the latest submitted configuration.
+
+    Submissions that arrive while a save is running are coalesced, only the
+    newest one is written afterwards.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = None  # (path, config) waiting to be written
+        self.busy = False  # Whether a save is being written right now
+        self.closed = False
+        self.error = None  # Last save error, taken by the UI with take_error()
+        self.saves = 0
+        self.thread = threading.Thread(target=self._run, name="config-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, path, config):
+        with self.condition:
+            self.pending = (path, config)
+            self.condition.notify()
+
+    def idle(self):
+        with self.condition:
+            return self.pending is None and not self.busy
+
+    def take_error(self):
+        with self.condition:
+            error, self.error = self.error, None
+            return error
+
+    def close(self):
+        """Write what is still pending and stop the thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                path, config = self.pending
+                self.pending = None
+                self.busy = True
+            try:
+                if binarydeck.is_binary_deck(path):
+                    write_atomic(path, lambda f: binarydeck.write_deck(config, f), binary=True)
+                else:
+                    write_atomic(path, lambda f: dump_config(config, f))
+                self.saves += 1
+            except (OSError, TypeError, ValueError) as e:
+                with self.condition:
+                    self.error = e
+            finally:
+                with self.condition:
+                    self.busy = False
@@ -0,0 +1,137 @@
+"""Micro-benchmarks for the hot paths of the trainer.
+
+Run from the Scripts folder, e.g. ``python bench.py normalize``.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import timeit
+
+from binarydeck import MappedDeck, MappedPromptStore, write_deck
+from deck import PromptStore
+import keymap
+from engine import TrainerEngine
+
+# A typical mix of raw (scan_code, name) pairs as reported by the keyboard library
+SAMPLE_EVENTS = [
+    (29, 'ctrl'), (46, 'c'), (29, 'left ctrl'), (47, 'v'), (42, 'shift'),
+    (30, 'A'), (56, 'alt'), (62, 'f4'), (28, 'enter'), (1, 'esc'),
+    (15, 'tab'), (57, 'space'), (12, 'minus'), (2, '1'), (91, 'left windows'),
+    (83, 'delete'),
+]
+
+
+def _report(label, seconds, events):
+    print(f"{label:<24} {seconds / events * 1e9:8.1f} ns/event")
+
+
+def bench_normalize(args):
+    """Compare the string normalization path with the precomputed event table."""
+    events = SAMPLE_EVENTS * 1000
+
+    def string_path():
+        for scan_code, name in events:
+            keymap.key_bit(keymap.normalize_key(name))
+
+    def table_path():
+        for scan_code, name in events:
+            keymap.event_key_bit(scan_code, name)
+
+    table_path()  # Warm up the table like a running session would
+    for label, func in (("string normalization", string_path), ("event table", table_path)):
+        seconds = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        _report(label, seconds, len(events))
+
+
+def make_deck(size, seed=0):
+    """Build a synthetic deck of single keys and modifier chords."""
+    rng = random.Random(seed)
+    keys = list("abcdefghijklmnopqrstuvwxyz0123456789") + [f"f{i}" for i in range(1, 13)]
+    deck = []
+    for i in range(size):
+        modifiers = rng.sample(keymap.MODIFIERS, rng.randint(0, 3))
+        hotkey = keymap.format_hotkey(modifiers + [rng.choice(keys)])
+        deck.append({"name": f"prompt {i}", "hotkey": hotkey, "weight": 1.0})
+    return deck
+
+
+def drive_engine(engine, answers, wrong_every=7):
+    """Answer the active prompt `answers` times, returns the number of key events fed."""
+    wrong_bit = keymap.key_bit("wrong key")
+    events = 0
+    for i in range(answers):
+        if i % wrong_every == 0:
+            engine.key_down(wrong_bit)
+            engine.key_up(wrong_bit)
+            events += 2
+        bits = [keymap.key_bit(k) for k in keymap.split_hotkey(engine.displayed_prompts[-1]["hotkey"])]
+        for bit in bits:  # Modifiers come first in a formatted hotkey
+            engine.key_down(bit)
+        for bit in bits:
+            engine.key_up(bit)
+        events += 2 * len(bits)
+    return events
+
+
+def bench_engine(args):
+    """Feed synthetic answers through the headless engine."""
+    engine = TrainerEngine(rng=random.Random(args.seed))
+    engine.load_deck(make_deck(args.deck_size, args.seed), 3, [])
+    engine.set_spaced_repetition(args.spaced)
+    engine.ensure_prompts()
+    start = time.perf_counter()
+    events = drive_engine(engine, args.answers)
+    seconds = time.perf_counter() - start
+    print(f"{len(engine.prompts)} prompts, {args.answers} answers")
+    _report("engine", seconds, events)
+    print(f"{events / seconds:,.0f} events/s")
+
+
+def bench_load(args):
+    """Load the same deck from JSON and from a binary deck file."""
+    config = {"prompts": PromptStore(make_deck(args.deck_size, args.seed)).snapshot(), "visible_prompts": 3}
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "deck.json")
+        binary_path = os.path.join(directory, "deck.hkdeck")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        with open(binary_path, "wb") as f:
+            write_deck(config, f)
+
+        def load_json():
+            with open(json_path, encoding="utf-8") as f:
+                TrainerEngine().load_deck(json.load(f)["prompts"], 3, [])
+
+        def load_binary():
+            TrainerEngine().load_deck(MappedPromptStore(MappedDeck(binary_path)), 3, [])
+
+        print(f"{args.deck_size} prompts")
+        for label, func in (("json", load_json), ("binary", load_binary)):
+            seconds = min(timeit.repeat(func, number=1, repeat=args.repeat))
+            print(f"{label:<24} {seconds * 1e3:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="number of timing runs, best one is reported")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    subparsers.add_parser("normalize", help=bench_normalize.__doc__).set_defaults(func=bench_normalize)
+    engine_parser = subparsers.add_parser("engine", help=bench_engine.__doc__)
+    engine_parser.add_argument("--deck-size", type=int, default=500)
+    engine_parser.add_argument("--answers", type=int, default=20000)
+    engine_parser.add_argument("--seed", type=int, default=0)
+    engine_parser.add_argument("--spaced", action="store_true", help="use spaced repetition scheduling")
+    engine_parser.set_defaults(func=bench_engine)
+    load_parser = subparsers.add_parser("load", help=bench_load.__doc__)
+    load_parser.add_argument("--deck-size", type=int, default=100000)
+    load_parser.add_argument("--seed", type=int, default=0)
+    load_parser.set_defaults(func=bench_load)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
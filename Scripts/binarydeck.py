@@ -0,0 +1,402 @@
+"""Compact binary deck files, opened with mmap and read lazily.
+
+JSON stays the interchange format; a ".hkdeck" file holds the same deck for
+very large generated decks. Opening one maps the file and reads a small
+header, prompts are only built when the trainer looks them up, so load time
+and memory hardly depend on the number of prompts.
+
+Layout (all numbers in native byte order, recorded in the metadata):
+
+    header      MAGIC, version, metadata offset and length
+    columns     one fixed-width column per record field, 8-byte aligned:
+                ids (int64), weights (float64), name offsets and lengths
+                (uint32) and hotkey table indexes (uint32)
+    indexes     record positions sorted by name and by ID (uint32)
+    hotkeys     the distinct hotkeys: pool offset and length (uint32) and
+                the precompiled key mask, mask_bytes bytes each
+    pool        UTF-8 strings, every distinct name and hotkey stored once
+    metadata    JSON with the section offsets, the key of each mask bit and
+                the deck settings (visible prompts, sequence groups, ...)
+
+Masks use bits of the file's own key table, keymap assigns bits at runtime,
+so they are translated once per distinct hotkey when the deck is opened.
+
+    python binarydeck.py deck.json deck.hkdeck    # and back the other way
+"""
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+from deck import PromptStore
+import keymap
+
+EXTENSION = ".hkdeck"
+MAGIC = b"HKDECK\r\n"
+VERSION = 1
+HEADER = struct.Struct("<8sIQQ")  # Magic, version, metadata offset, metadata length
+ALIGN = 8
+
+# Section name -> array typecode of its items
+COLUMNS = {
+    "ids": "q",
+    "weights": "d",
+    "name_offsets": "I",
+    "name_lengths": "I",
+    "hotkey_refs": "I",
+    "name_index": "I",
+    "id_index": "I",
+    "hotkey_offsets": "I",
+    "hotkey_lengths": "I",
+}
+
+
+def is_binary_deck(path):
+    return path.lower().endswith(EXTENSION)
+
+
+def write_deck(config, f):
+    """Write a configuration (prompts may be any iterable) as a binary deck to a binary file."""
+    columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+    pool = bytearray()
+    strings = {}  # Pooled string -> (offset, length)
+    hotkey_refs = {}  # Hotkey -> index in the hotkey table
+    key_bits = {}  # Key name -> bit in the file's masks
+    masks = []
+    names = []  # Encoded name of each record, for the name index
+    next_id = 1
+
+    def pooled(text):
+        location = strings.get(text)
+        if location is None:
+            encoded = text.encode("utf-8")
+            location = strings[text] = (len(pool), len(encoded))
+            pool.extend(encoded)
+        return location
+
+    for prompt in config["prompts"]:
+        offset, length = pooled(prompt["name"])
+        columns["ids"].append(prompt["id"])
+        columns["weights"].append(prompt["weight"])
+        columns["name_offsets"].append(offset)
+        columns["name_lengths"].append(length)
+        names.append(pool[offset:offset + length])
+        next_id = max(next_id, prompt["id"] + 1)
+
+        hotkey = prompt["hotkey"]
+        ref = hotkey_refs.get(hotkey)
+        if ref is None:
+            ref = hotkey_refs[hotkey] = len(masks)
+            offset, length = pooled(hotkey)
+            columns["hotkey_offsets"].append(offset)
+            columns["hotkey_lengths"].append(length)
+            mask = 0
+            for key in keymap.split_hotkey(hotkey):
+                mask |= 1 << key_bits.setdefault(key, len(key_bits))
+            masks.append(mask)
+        columns["hotkey_refs"].append(ref)
+
+    count = len(names)
+    columns["name_index"].extend(sorted(range(count), key=names.__getitem__))  # Stable, ties by position
+    ids = columns["ids"]
+    columns["id_index"].extend(sorted(range(count), key=ids.__getitem__))
+    mask_bytes = max(1, (len(key_bits) + 7) // 8)
+    sections = dict(columns)
+    sections["hotkey_masks"] = b"".join(mask.to_bytes(mask_bytes, "little") for mask in masks)
+    sections["pool"] = pool
+
+    f.write(bytes(HEADER.size))
+    position = HEADER.size
+    locations = {}
+    for name, data in sections.items():
+        padding = -position % ALIGN
+        f.write(bytes(padding))
+        position += padding
+        data = memoryview(data).cast("B")
+        f.write(data)
+        locations[name] = (position, len(data))
+        position += len(data)
+
+    settings = {key: value for key, value in config.items() if key != "prompts"}
+    metadata = json.dumps({
+        "byteorder": sys.byteorder,
+        "count": count,
+        "next_id": next_id,
+        "keys": sorted(key_bits, key=key_bits.get),
+        "mask_bytes": mask_bytes,
+        "sections": locations,
+        "settings": settings,
+    }).encode("utf-8")
+    f.write(metadata)
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, position, len(metadata)))
+
+
+class MappedDeck:
+    """Read-only view of a binary deck file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # Keeps its own handle
+        try:
+            magic, version, offset, length = HEADER.unpack_from(self.map)
+        except struct.error:
+            raise ValueError(f"{path} is not a deck file") from None
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a deck file")
+        if version != VERSION:
+            raise ValueError(f"{path} is a deck file of unsupported version {version}")
+        metadata = json.loads(self.map[offset:offset + length].decode("utf-8"))
+        if metadata["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {metadata['byteorder']} endian machine")
+
+        self.count = metadata["count"]
+        self.next_id = metadata["next_id"]
+        self.settings = metadata["settings"]
+        self.mask_bytes = metadata["mask_bytes"]
+        view = memoryview(self.map)
+        sections = metadata["sections"]
+
+        def section(name):
+            start, size = sections[name]
+            return view[start:start + size]
+
+        # Columns are zero-copy views into the map
+        for name, typecode in COLUMNS.items():
+            setattr(self, name, section(name).cast(typecode))
+        self.masks = section("hotkey_masks")
+        self.pool_start = sections["pool"][0]
+        self.key_bits = [keymap.key_bit(key) for key in metadata["keys"]]  # File bit -> runtime bit
+        self.compiled = None  # Runtime masks by hotkey, translated on first use
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, offset, length):
+        start = self.pool_start + offset
+        return self.map[start:start + length].decode("utf-8")
+
+    def name(self, position):
+        return self._string(self.name_offsets[position], self.name_lengths[position])
+
+    def hotkey(self, ref):
+        return self._string(self.hotkey_offsets[ref], self.hotkey_lengths[ref])
+
+    def prompt(self, position):
+        """Build the prompt dictionary of a record."""
+        return {
+            "name": self.name(position),
+            "hotkey": self.hotkey(self.hotkey_refs[position]),
+            "weight": self.weights[position],
+            "id": self.ids[position],
+        }
+
+    def compiled_hotkeys(self):
+        """Runtime key mask of each distinct hotkey, translated from the precompiled masks."""
+        if self.compiled is not None:
+            return dict(self.compiled)
+        masks = {}
+        size = self.mask_bytes
+        for ref in range(len(self.hotkey_offsets)):
+            file_mask = int.from_bytes(self.masks[ref * size:(ref + 1) * size], "little")
+            mask = 0
+            bit = 0
+            while file_mask:
+                if file_mask & 1:
+                    mask |= self.key_bits[bit]
+                file_mask >>= 1
+                bit += 1
+            masks[self.hotkey(ref)] = mask
+        self.compiled = masks
+        return dict(masks)
+
+    def find_id(self, prompt_id):
+        """Position of the record with an ID, or None."""
+        index, ids = self.id_index, self.ids
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if ids[index[middle]] < prompt_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and ids[index[low]] == prompt_id:
+            return index[low]
+        return None
+
+    def find_name(self, name):
+        """Positions of the records with a name, in file order."""
+        key = name.encode("utf-8")
+        index = self.name_index
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_bytes(index[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        positions = []
+        while low < self.count and self._name_bytes(index[low]) == key:
+            positions.append(index[low])
+            low += 1
+        return positions
+
+    def _name_bytes(self, position):
+        start = self.pool_start + self.name_offsets[position]
+        return self.map[start:start + self.name_lengths[position]]
+
+    def names(self):
+        """The distinct names, in sorted order."""
+        previous = None
+        for position in self.name_index:
+            name = self._name_bytes(position)
+            if name != previous:
+                previous = name
+                yield name.decode("utf-8")
+
+
+class DeckSnapshot:
+    """Prompts of a MappedPromptStore at one point in time, iterable from another thread."""
+
+    def __init__(self, deck, removed, extra):
+        self.deck = deck
+        self.removed = removed
+        self.extra = extra
+
+    def __iter__(self):
+        deck = self.deck
+        for position in range(len(deck)):
+            if deck.ids[position] not in self.removed:
+                yield deck.prompt(position)
+        yield from self.extra
+
+
+class MappedPromptStore:
+    """The PromptStore interface over a MappedDeck.
+
+    Prompt dictionaries are built the first time they are looked up and kept,
+    so the same prompt is always the same dictionary. Prompts added or removed
+    while training live in memory on top of the file.
+    """
+
+    def __init__(self, deck):
+        self.deck = deck
+        self.loaded = {}  # Prompt ID -> dictionary of the deck prompts looked up so far
+        self.removed = set()  # IDs of deck prompts removed since opening
+        self.extra = PromptStore()  # Prompts added since opening
+        self.extra.next_id = deck.next_id
+
+    def __len__(self):
+        return len(self.deck) - len(self.removed) + len(self.extra)
+
+    def __iter__(self):
+        # Dictionaries not looked up yet are built on the fly and not kept
+        deck = self.deck
+        for position in range(len(deck)):
+            prompt_id = deck.ids[position]
+            if prompt_id not in self.removed:
+                yield self.loaded.get(prompt_id) or deck.prompt(position)
+        yield from self.extra
+
+    def _in_deck(self, prompt_id):
+        return prompt_id not in self.removed and self.deck.find_id(prompt_id) is not None
+
+    def add(self, prompt):
+        prompt_id = prompt.get("id")
+        if isinstance(prompt_id, int) and self._in_deck(prompt_id):
+            prompt["id"] = self.extra.next_id
+        return self.extra.add(prompt)
+
+    def remove(self, prompt_id):
+        if self.extra.get(prompt_id) is not None:
+            return self.extra.remove(prompt_id)
+        prompt = self.get(prompt_id)
+        if prompt is None:
+            raise KeyError(prompt_id)
+        self.removed.add(prompt_id)
+        del self.loaded[prompt_id]
+        return prompt
+
+    def get(self, prompt_id):
+        prompt = self.loaded.get(prompt_id)
+        if prompt is None:
+            prompt = self.extra.get(prompt_id)
+            if prompt is None and prompt_id not in self.removed:
+                position = self.deck.find_id(prompt_id)
+                if position is not None:
+                    prompt = self.loaded[prompt_id] = self.deck.prompt(position)
+        return prompt
+
+    def ids(self, name):
+        ids = [self.deck.ids[position] for position in self.deck.find_name(name)]
+        if self.removed:
+            ids = [prompt_id for prompt_id in ids if prompt_id not in self.removed]
+        ids.extend(self.extra.ids(name))
+        return ids
+
+    def first(self, name):
+        ids = self.ids(name)
+        return self.get(ids[0]) if ids else None
+
+    def names(self):
+        for name in self.deck.names():
+            if not self.removed or self.ids(name):
+                yield name
+        for name in self.extra.names():
+            if not self.deck.find_name(name):
+                yield name
+
+    def _edited(self):
+        return self.removed or len(self.extra)
+
+    def id_list(self):
+        if not self._edited():
+            return self.deck.ids  # A view of the file, nothing is copied
+        ids = [prompt_id for prompt_id in self.deck.ids.tolist() if prompt_id not in self.removed]
+        return ids + self.extra.id_list()
+
+    def prompt_weights(self):
+        if not self._edited():
+            return self.deck.weights.tolist()
+        deck = self.deck
+        weights = [weight for prompt_id, weight in zip(deck.ids.tolist(), deck.weights.tolist())
+                   if prompt_id not in self.removed]
+        return weights + self.extra.prompt_weights()
+
+    def hotkeys(self):
+        return set(self.deck.compiled_hotkeys()) | self.extra.hotkeys()
+
+    def hotkey_masks(self):
+        masks = self.deck.compiled_hotkeys()
+        masks.update(self.extra.hotkey_masks())
+        return masks
+
+    def snapshot(self):
+        return DeckSnapshot(self.deck, set(self.removed), self.extra.snapshot())
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a deck between JSON and the binary format.")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    if is_binary_deck(args.source):
+        deck = MappedDeck(args.source)
+        config = {"prompts": [deck.prompt(position) for position in range(len(deck))]}
+        config.update(deck.settings)
+        with open(args.target, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+    else:
+        with open(args.source, encoding="utf-8") as f:
+            config = json.load(f)
+        config["prompts"] = PromptStore(config["prompts"]).snapshot()  # Gives every prompt an ID
+        with open(args.target, "wb") as f:
+            write_deck(config, f)
+
+
+if __name__ == "__main__":
+    main()
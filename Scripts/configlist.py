@@ -0,0 +1,158 @@
+"""Virtualized list for the configuration shown in the Settings window.
+
+Only a fixed pool of row widgets exists. Scrolling binds the pool to other
+items instead of creating widgets, so opening Settings or deleting a prompt
+costs the same for ten prompts or a hundred thousand.
+"""
+from collections import namedtuple
+import tkinter as tk
+from tkinter import ttk
+
+VISIBLE_ROWS = 15  # Row widgets in the pool
+WHEEL_ROWS = 3  # Rows scrolled per mouse wheel step
+
+# One entry of the list. Headers are bold and have no controls, a row gets a
+# delete button with on_delete(key) and a weight entry with on_weight(key, weight),
+# which raises ValueError for a weight it refuses.
+# Callbacks take the key instead of closing over it, so an item equals the
+# one built for the same row before and rebinding it is skipped.
+ListItem = namedtuple("ListItem", "text header key on_delete weight on_weight",
+                      defaults=(False, None, None, None, None))
+
+
+class VirtualList:
+    def __init__(self, parent, rows=VISIBLE_ROWS):
+        self.frame = ttk.Frame(parent)
+        self.count = 0  # Number of items
+        self.item_at = None  # Callable returning the ListItem at an index
+        self.first = 0  # Index of the item in the top row
+        self.bound = []  # Item each pool row currently shows
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        rows_frame = ttk.Frame(self.frame)
+        rows_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.bold_font = ("", 10, "bold")
+        self.rows = []
+        for _ in range(rows):
+            frame = ttk.Frame(rows_frame)
+            frame.pack(fill=tk.X, pady=2)
+            label = ttk.Label(frame, anchor="w")
+            label.pack(side=tk.LEFT)
+            delete_button = ttk.Button(frame, text="×", width=3)
+            weight_var = tk.StringVar()
+            weight_entry = ttk.Entry(frame, textvariable=weight_var, width=8)
+            weight_label = ttk.Label(frame, text="Weight:")
+            row = {
+                'frame': frame,
+                'label': label,
+                'delete': delete_button,
+                'weight_var': weight_var,
+                'weight_entry': weight_entry,
+                'weight_label': weight_label,
+                'committed': None,  # Weight text last applied or bound, anything else is pending
+            }
+            # Weights are applied when the entry is confirmed or left, not per keystroke
+            weight_entry.bind('<Return>', lambda e, r=row: self._commit_weight(r))
+            weight_entry.bind('<FocusOut>', lambda e, r=row: self._commit_weight(r))
+            for widget in (frame, label):
+                widget.bind('<MouseWheel>', self._on_wheel)
+                widget.bind('<Button-4>', lambda e: self.scroll(-WHEEL_ROWS))
+                widget.bind('<Button-5>', lambda e: self.scroll(WHEEL_ROWS))
+            self.rows.append(row)
+            self.bound.append(None)
+
+    def set_source(self, count, item_at):
+        """Show count items, item_at(index) builds the ListItem of one index when it is scrolled into view."""
+        self.count = count
+        self.item_at = item_at
+        self.first = max(0, min(self.first, count - len(self.rows)))
+        self.refresh()
+
+    def refresh(self):
+        """Bind the pool rows to the items at the current scroll position."""
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            item = self.item_at(index) if index < self.count else None
+            self._bind_row(i, row, item)
+        if self.count:
+            self.scrollbar.set(self.first / self.count, min(1.0, (self.first + len(self.rows)) / self.count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _bind_row(self, i, row, item):
+        old = self.bound[i]
+        if item == old:
+            return
+        self.bound[i] = item
+        if item is None:
+            row['label'].configure(text="")
+        else:
+            row['label'].configure(text=item.text, font=self.bold_font if item.header else "")
+
+        # Show only the controls this item has, packed in the order
+        # label, "Weight:", weight entry, delete button
+        has_weight = item is not None and item.on_weight is not None
+        had_weight = old is not None and old.on_weight is not None
+        if has_weight:
+            row['committed'] = str(item.weight)
+            row['weight_var'].set(row['committed'])
+        if has_weight != had_weight:
+            if has_weight:
+                row['weight_label'].pack(side=tk.RIGHT, padx=(5, 0), after=row['label'])
+                row['weight_entry'].pack(side=tk.RIGHT, padx=(0, 5), after=row['weight_label'])
+            else:
+                row['weight_label'].pack_forget()
+                row['weight_entry'].pack_forget()
+        has_delete = item is not None and item.on_delete is not None
+        had_delete = old is not None and old.on_delete is not None
+        if has_delete:
+            row['delete'].configure(command=lambda: self._delete(item))
+        if has_delete != had_delete:
+            if has_delete:
+                row['delete'].pack(side=tk.RIGHT, after=row['weight_entry'] if has_weight else row['label'])
+            else:
+                row['delete'].pack_forget()
+
+    def _commit_weight(self, row):
+        item = self.bound[self.rows.index(row)]
+        text = row['weight_var'].get()
+        if item is None or item.on_weight is None or text == row['committed']:
+            return
+        try:
+            item.on_weight(item.key, float(text))
+        except ValueError:  # Not a number, or one on_weight refuses
+            text = "1.0"
+            row['weight_var'].set(text)
+            item.on_weight(item.key, 1.0)
+        row['committed'] = text
+
+    def _commit_pending(self):
+        """Apply weights typed but not confirmed yet, before their rows show other items."""
+        for row in self.rows:
+            self._commit_weight(row)
+
+    def _delete(self, item):
+        # Keys of the following items shift after a delete, so pending weights go first
+        self._commit_pending()
+        item.on_delete(item.key)
+
+    def yview(self, *args):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", amount, "units"/"pages")."""
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * self.count)
+            self.scroll(0)
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self.scroll(amount * len(self.rows) if args[2] == "pages" else amount)
+
+    def scroll(self, rows):
+        first = max(0, min(self.first + rows, self.count - len(self.rows)))
+        if first != self.first or not rows:
+            self._commit_pending()
+            self.first = first
+            self.refresh()
+
+    def _on_wheel(self, event):
+        self.scroll(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS)
@@ -0,0 +1,103 @@
+"""Prompt storage and sequence group parsing.
+
+Prompts are kept by a stable ID and by name, so looking one up, adding one
+and deleting one never scans the deck. Sequence groups reference prompts by
+name in the configuration; the engine resolves those names once when the
+deck is loaded.
+"""
+import keymap
+
+
+class PromptStore:
+    """Prompt dictionaries indexed by ID and by name.
+
+    Every prompt gets an "id" key when it is added. IDs found in a loaded
+    configuration are kept unless they collide, so they stay the same across
+    sessions. Several prompts may share a name, they share its adaptive state.
+    """
+
+    def __init__(self, prompts=()):
+        self.by_id = {}  # Prompt ID -> prompt, in insertion order
+        self.by_name = {}  # Prompt name -> {prompt ID: None}, in insertion order
+        self.next_id = 1
+        for prompt in prompts:
+            self.add(prompt)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def add(self, prompt):
+        """Add a prompt and return its ID."""
+        prompt_id = prompt.get("id")
+        if not isinstance(prompt_id, int) or prompt_id in self.by_id:
+            prompt_id = prompt["id"] = self.next_id
+        self.next_id = max(self.next_id, prompt_id + 1)
+        self.by_id[prompt_id] = prompt
+        self.by_name.setdefault(prompt["name"], {})[prompt_id] = None
+        return prompt_id
+
+    def remove(self, prompt_id):
+        """Remove a prompt by ID and return it."""
+        prompt = self.by_id.pop(prompt_id)
+        ids = self.by_name[prompt["name"]]
+        del ids[prompt_id]
+        if not ids:
+            del self.by_name[prompt["name"]]
+        return prompt
+
+    def get(self, prompt_id):
+        return self.by_id.get(prompt_id)
+
+    def ids(self, name):
+        """IDs of the prompts with this name."""
+        return self.by_name.get(name, ())
+
+    def first(self, name):
+        """The first prompt added with this name, or None."""
+        ids = self.by_name.get(name)
+        return self.by_id[next(iter(ids))] if ids else None
+
+    def names(self):
+        return self.by_name.keys()
+
+    def id_list(self):
+        """IDs of all prompts in insertion order."""
+        return list(self.by_id)
+
+    def prompt_weights(self):
+        """The configured weight of each prompt, in id_list() order."""
+        return [prompt["weight"] for prompt in self.by_id.values()]
+
+    def hotkeys(self):
+        """The distinct hotkeys of the deck."""
+        return {prompt["hotkey"] for prompt in self.by_id.values()}
+
+    def hotkey_masks(self):
+        """Compiled key bitmask of each distinct hotkey."""
+        return {hotkey: keymap.compile_hotkey(hotkey) for hotkey in self.hotkeys()}
+
+    def snapshot(self):
+        """The prompts as they are now, for saving on another thread."""
+        return list(self.by_id.values())
+
+
+def normalize_sequence_groups(groups):
+    """Bring sequence groups into the {"name", "prompts", "weight"} form.
+
+    Older configurations store a group as a bare list of prompt names, those
+    are named after their position.
+    """
+    normalized = []
+    for index, group in enumerate(groups):
+        if isinstance(group, dict):
+            normalized.append({
+                "name": group.get("name", f"Sequence {index + 1}"),
+                "prompts": list(group.get("prompts", [])),
+                "weight": group.get("weight", 1.0),
+            })
+        else:
+            normalized.append({"name": f"Sequence {index + 1}", "prompts": list(group), "weight": 1.0})
+    return normalized
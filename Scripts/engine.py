@@ -0,0 +1,619 @@
+"""Headless trainer logic: prompt matching, adaptive weights and prompt selection.
+
+TrainerEngine knows nothing about Tk or the keyboard hook. It is fed key bits
+(see keymap) and reports what changed, so the GUI, benchmarks and replays all
+drive the same code.
+"""
+import math
+import random
+from collections import defaultdict
+
+import keymap
+from binarydeck import MappedPromptStore
+from deck import PromptStore, normalize_sequence_groups
+from reaction import ReactionTimes
+from sampling import FenwickSampler, PrefetchQueue
+from scheduler import SpacedRepetitionScheduler
+
+MAX_VISIBLE_PROMPTS = 10
+FACTOR_REFRESH_CHUNK = 16  # Names whose reaction factor is refreshed per answer after the reference moved
+
+# Change flags returned by TrainerEngine.key_down
+KEYS_CHANGED = 1  # The set of held keys (and last_pressed_hotkey) changed
+STACK_CHANGED = 2  # Visible prompts, the active highlight or the error indicator changed
+PROMPT_COMPLETED = 4  # The active prompt was answered correctly
+WRONG_ATTEMPT = 8  # A wrong key was pressed for the active prompt
+
+
+def check_weight(weight):
+    """Return a configured weight as a float, raise ValueError unless it is finite and positive.
+
+    Negative weights break the sampler's tree search and NaN or inf poison its total.
+    """
+    weight = float(weight)
+    if not (math.isfinite(weight) and weight > 0):
+        raise ValueError(f"weight must be a positive number, not {weight}")
+    return weight
+
+
+class TrainerEngine:
+    def __init__(self, rng=None):
+        self.rng = rng or random.Random()  # Source of randomness for prompt selection
+        # Draws the prefetched batches; derived from rng so seeded runs and replays repeat
+        self.prefetch_rng = random.Random(self.rng.getrandbits(64))
+
+        # Deck
+        self.prompts = PromptStore()  # Prompt dictionaries by ID and by name
+        self.visible_prompts = 3  # Default number of visible prompts
+        self.sequence_groups = []  # List of prompt sequences, prompts referenced by name
+        self.group_prompts = []  # Prompt dictionaries of each sequence group, resolved at load
+        self.group_members = defaultdict(set)  # Prompt name -> indexes of the groups using it
+        self.dangling_names = {}  # Sequence group name -> names without a prompt
+        self.hotkey_masks = {}  # Compiled bitmask for each prompt hotkey
+        self.sampler = FenwickSampler()  # Effective weights of sequence groups, then prompts
+        self.slot_ids = []  # Sampler slot -> prompt ID, None for sequence group slots
+        self.prompt_slots = {}  # Prompt ID -> sampler slot
+        self.prefetched = PrefetchQueue()  # Sampler slots drawn ahead of time
+        self.group_indexes = {}  # Sequence group name -> index
+        self.scheduler = None  # SpacedRepetitionScheduler when in spaced repetition mode
+        self.saved_schedule = (0, {})  # Scheduler state (clock, unit states) to continue from when it is on
+
+        # Adaptive state
+        self.weights = defaultdict(lambda: 1.0)  # Weights for each prompt
+        self.consecutive_correct = defaultdict(int)  # Track consecutive correct answers
+        self.reaction_times = ReactionTimes()  # Reaction time averages per prompt
+        self.stale_factors = []  # Names whose slots still use the previous reaction time reference
+        self.learning_listener = None  # Called with (name, weight, consecutive correct) after each change
+        self.schedule_listener = None  # Called with (unit key, (stability, ease, reps, due), clock) per review
+        self.attempt_listener = None  # Called with (prompt, pressed hotkey, correct, reaction ns or None) per attempt
+
+        # Session state
+        self.current_sequence = None  # Prompts of the sequence group being shown
+        self.sequence_position = 0  # Next prompt of the current sequence to put on the stack
+        self.sequence_countdown = 0  # Answers left until the current sequence is done
+        self.current_group = None  # Scheduler key of the sequence group being shown
+        self.group_missed = False  # Whether a prompt of the current group was missed
+        self.active_missed = False  # Whether the active prompt was missed before completion
+        self.activation = 0  # Bumped whenever a new prompt may have become the active one
+        self.shown_activation = -1  # Activation the active_since timestamp belongs to
+        self.active_since = None  # perf_counter_ns when the active prompt was first drawn
+        self.last_reaction_ns = None  # Reaction time of the last completed prompt
+        self.displayed_prompts = []  # Track currently displayed prompts, the last one is active
+        self.wrong_attempt = False  # Track if last attempt was wrong
+        self.last_pressed_hotkey = ""  # Track the last pressed hotkey
+        self.current_mask = 0  # Bitmask of currently pressed keys
+        self.waiting_for_combination = False  # Track if we're waiting for a complete combination
+        self.target_hotkey_mask = 0  # Bitmask of the target hotkey
+
+    def load_deck(self, prompts, visible_prompts, sequence_groups):
+        """Replace the deck with a loaded configuration.
+
+        prompts is a list of prompt dictionaries or a MappedPromptStore of a
+        binary deck. Returns the prompt names of each sequence group that don't match any
+        prompt, those are left out of the group.
+        """
+        self.prompts = prompts if isinstance(prompts, MappedPromptStore) else PromptStore(prompts)
+        self.visible_prompts = visible_prompts
+        self.sequence_groups = normalize_sequence_groups(sequence_groups)
+        self.compile_hotkeys()
+        self.rebuild_sampler()
+        self.reset_display()  # The stack may hold prompts of the previous deck
+        return dict(self.dangling_names)
+
+    def add_prompt(self, prompt):
+        """Add one prompt without rebuilding the sampler, ValueError if its weight is unusable."""
+        check_weight(prompt["weight"])
+        prompt_id = self.prompts.add(prompt)
+        self.compile_hotkeys((prompt,))
+        self.prompt_slots[prompt_id] = len(self.sampler)
+        self.slot_ids.append(prompt_id)
+        self.sampler.append(self._prompt_weight(prompt))
+        self.prefetched.clear()
+        if len(self.prompts.ids(prompt["name"])) == 1:
+            self._name_added(prompt["name"])
+
+    def add_prompts(self, prompts):
+        """Add many prompts at once with a single sampler rebuild."""
+        for prompt in prompts:
+            self.prompts.add(prompt)
+        self.compile_hotkeys(prompts)
+        self.rebuild_sampler()
+
+    def remove_prompt(self, prompt):
+        """Remove one prompt, the last sampler slot takes over its slot."""
+        self.prompts.remove(prompt["id"])
+        slot = self.prompt_slots.pop(prompt["id"])
+        last = len(self.sampler) - 1
+        if slot != last:
+            moved = self.slot_ids[last]
+            self.sampler.update(slot, self.sampler.weights[last])
+            self.slot_ids[slot] = moved
+            self.prompt_slots[moved] = slot
+        self.sampler.pop()
+        self.slot_ids.pop()
+        self.prefetched.clear()
+        self._name_removed(prompt["name"])
+        # The running sequence keeps its own list, _name_removed only updated the group
+        shown = self.displayed_prompts + (self.current_sequence or [])
+        if any(other["id"] == prompt["id"] for other in shown):
+            self.reset_display()
+
+    def _name_added(self, name):
+        if self.scheduler:
+            self.scheduler.add_unit(("prompt", name))
+        if name in self.group_members:
+            self._recompile_groups(self.group_members[name])
+
+    def _name_removed(self, name):
+        if self.scheduler and not self.prompts.ids(name):
+            self.scheduler.remove_unit(("prompt", name))
+        if name in self.group_members:
+            # Groups may have pointed at the removed prompt
+            self._recompile_groups(self.group_members[name])
+
+    def add_sequence_group(self, group):
+        """Add a sequence group, returns its prompt names that don't match any prompt."""
+        self.sequence_groups.append(normalize_sequence_groups([group])[0])
+        self.rebuild_sampler()
+        return self.dangling_names.get(self.sequence_groups[-1]["name"], [])
+
+    def remove_sequence_group(self, index):
+        del self.sequence_groups[index]
+        self.rebuild_sampler()
+
+    def set_sequence_weight(self, index, weight):
+        """Change the configured weight of a sequence group, ValueError if it is unusable."""
+        self.sequence_groups[index]["weight"] = check_weight(weight)
+        self._update_slot(index, self._group_weight(index))
+
+    def set_weight(self, name, weight):
+        """Change the adaptive weight of a prompt name and its sampler slots."""
+        self.weights[name] = weight
+        factor = self.reaction_times.factor(name)
+        for prompt_id in self.prompts.ids(name):
+            slot = self.prompt_slots[prompt_id]
+            self._update_slot(slot, weight * factor * self.prompts.get(prompt_id)["weight"])
+
+    def learning_state(self):
+        """Adaptive state worth keeping: {name: (weight, consecutive correct)}."""
+        return {name: (weight, self.consecutive_correct[name]) for name, weight in self.weights.items()}
+
+    def restore_learning(self, state):
+        """Replace the adaptive state with a saved one."""
+        self.weights = defaultdict(lambda: 1.0)
+        self.consecutive_correct = defaultdict(int)
+        for name, (weight, correct) in state.items():
+            self.weights[name] = weight
+            self.consecutive_correct[name] = correct
+        self.rebuild_sampler()
+
+    def schedule_state(self):
+        """Spaced repetition state worth keeping: (clock, {unit key: (stability, ease, reps, due)})."""
+        return self.scheduler.save() if self.scheduler else self.saved_schedule
+
+    def restore_schedule(self, schedule):
+        """Replace the spaced repetition state with a saved one."""
+        self.saved_schedule = schedule
+        if self.scheduler:
+            self.scheduler.restore(*schedule)
+            self.scheduler.set_units(self._unit_keys())
+
+    def _update_slot(self, index, weight):
+        self.prefetched.weight_changed(self.sampler.weights[index], weight)
+        self.sampler.update(index, weight)
+
+    def _prompt_weight(self, prompt):
+        name = prompt["name"]
+        return self.weights[name] * self.reaction_times.factor(name) * prompt["weight"]
+
+    def _group_weight(self, index):
+        # A group without any resolved prompt can't be shown
+        return self.sequence_groups[index].get("weight", 1.0) if self.group_prompts[index] else 0.0
+
+    def _compile_group(self, index):
+        """Resolve the prompt names of a sequence group to prompt dictionaries."""
+        group = self.sequence_groups[index]
+        prompts = []
+        missing = []
+        for name in group["prompts"]:
+            prompt = self.prompts.first(name)
+            if prompt is None:
+                missing.append(name)
+            else:
+                prompts.append(prompt)
+        if missing:
+            self.dangling_names[group["name"]] = missing
+        else:
+            self.dangling_names.pop(group["name"], None)
+        return prompts
+
+    def _recompile_groups(self, indexes):
+        """Resolve some sequence groups again after prompts with their names came or went."""
+        schedulable_changed = False
+        for index in indexes:
+            was_empty = not self.group_prompts[index]
+            self.group_prompts[index] = self._compile_group(index)
+            schedulable_changed |= was_empty != (not self.group_prompts[index])
+            self._update_slot(index, self._group_weight(index))
+        if self.scheduler and schedulable_changed:
+            self.scheduler.set_units(self._unit_keys())
+
+    def rebuild_sampler(self):
+        """Recreate the sampler after sequence groups were changed or the deck was loaded."""
+        self.group_indexes = {}
+        self.group_members = defaultdict(set)
+        self.dangling_names = {}
+        self.group_prompts = []
+        sampler_weights = []
+        for index, group in enumerate(self.sequence_groups):
+            self.group_indexes[group["name"]] = index
+            for name in group["prompts"]:
+                self.group_members[name].add(index)
+            self.group_prompts.append(self._compile_group(index))
+            sampler_weights.append(self._group_weight(index))
+        first_slot = len(sampler_weights)
+        prompt_ids = self.prompts.id_list()
+        self.slot_ids = [None] * first_slot
+        self.slot_ids.extend(prompt_ids)
+        self.prompt_slots = dict(zip(prompt_ids, range(first_slot, first_slot + len(prompt_ids))))
+        # Start from the configured weights, then apply the adaptive state of
+        # the names that have any, so untouched prompts are never looked at
+        sampler_weights.extend(self.prompts.prompt_weights())
+        for name in self.weights.keys() | self.reaction_times.stats.keys():
+            factor = self.weights.get(name, 1.0) * self.reaction_times.factor(name)
+            if factor != 1.0:
+                for slot in self._name_slots(name):
+                    sampler_weights[slot] *= factor
+        self.sampler = FenwickSampler(sampler_weights)
+        self.stale_factors = []
+        self.prefetched.clear()
+        if self.scheduler:
+            self.scheduler.set_units(self._unit_keys())
+
+    def prefetch(self):
+        """Draw the next batch of slots if the queue runs low.
+
+        Meant to be called while idle so the keystroke path only pops slots.
+        Returns True if a batch was drawn; traces record when that happened
+        so replays refill at the same points (see keytrace).
+        """
+        if not self.prefetched.needs_fill(len(self.sampler)):
+            return False
+        self.prefetched.fill(self.sampler.weights, self.prefetch_rng)
+        return True
+
+    def _draw(self, exclude, start=0):
+        """Draw one sampler slot that isn't in exclude, from the prefetched batch when possible.
+
+        With start, only slots from it on are accepted (the prompts without the
+        sequence groups). Prefetched slots that don't fit are skipped. If
+        exclude leaves nothing to draw, repeats are allowed again so a small
+        deck still fills the stack.
+        """
+        index = self.prefetched.pop()
+        if index is not None and index not in exclude and index >= start:
+            return index
+        index = self.sampler.sample_excluding(self.rng, exclude, start=start)
+        if index is None:
+            index = self.sampler.sample(self.rng, start=start)
+        return index
+
+    def _name_slots(self, name):
+        """Sampler slots of the prompts sharing a name."""
+        return [self.prompt_slots[prompt_id] for prompt_id in self.prompts.ids(name)]
+
+    def _visible_slots(self):
+        """Sampler slots of the prompts currently on screen."""
+        slots = set()
+        for prompt in self.displayed_prompts:
+            slots.update(self._name_slots(prompt["name"]))
+        return slots
+
+    def set_visible_prompts(self, count):
+        """Change the number of visible prompts, returns True if it changed."""
+        if count == self.visible_prompts:
+            return False
+        self.visible_prompts = count
+        self.reset_display()
+        return True
+
+    def reset_display(self):
+        """Drop the visible stack so it is drawn again."""
+        self.displayed_prompts = []
+        self.activation += 1
+        # A sequence that was partly on screen starts over when it is drawn again
+        self.current_sequence = None
+        self.current_group = None
+        if self.scheduler:
+            # Prompts that were on screen go back to the schedule unreviewed
+            self.scheduler.release_all()
+
+    def set_spaced_repetition(self, enabled):
+        """Switch between weighted random selection and spaced repetition."""
+        if enabled == bool(self.scheduler):
+            return
+        if enabled:
+            self.scheduler = SpacedRepetitionScheduler(self.rng)
+            self.scheduler.restore(*self.saved_schedule)
+        else:
+            self.saved_schedule = self.scheduler.save()
+            self.scheduler = None
+        self.rebuild_sampler()
+        self.reset_display()
+
+    def _unit_keys(self):
+        """Scheduler keys of all prompts and sequence groups."""
+        for name in self.prompts.names():
+            yield ("prompt", name)
+        for name, index in self.group_indexes.items():
+            if self.group_prompts[index]:
+                yield ("sequence", name)
+
+    def compile_hotkeys(self, prompts=None):
+        """Compile the hotkey of every prompt (or just the given ones) into its key bitmask."""
+        if prompts is None:
+            # Per distinct hotkey; binary decks come with their masks precompiled
+            self.hotkey_masks.update(self.prompts.hotkey_masks())
+            return
+        for prompt in prompts:
+            hotkey = prompt["hotkey"]
+            if hotkey not in self.hotkey_masks:
+                self.hotkey_masks[hotkey] = keymap.compile_hotkey(hotkey)
+
+    def prompt_mask(self, prompt):
+        """Get the compiled bitmask of a prompt's hotkey."""
+        hotkey = prompt["hotkey"]
+        mask = self.hotkey_masks.get(hotkey)
+        if mask is None:
+            mask = self.hotkey_masks[hotkey] = keymap.compile_hotkey(hotkey)
+        return mask
+
+    def ensure_prompts(self):
+        """Fill the visible stack if it is empty."""
+        if not self.displayed_prompts:
+            next_prompts = self.next_prompts()
+            if next_prompts:
+                # The first prompt to answer goes to the bottom
+                self.displayed_prompts = next_prompts[::-1]
+                self.activation += 1
+
+    def mark_shown(self, timestamp):
+        """Note when the active prompt was first drawn on screen (perf_counter_ns)."""
+        if self.shown_activation != self.activation and self.displayed_prompts:
+            self.shown_activation = self.activation
+            self.active_since = timestamp
+
+    def next_prompts(self, count=None):
+        """Pick the next prompts in answering order, up to count (defaults to a full visible stack)."""
+        if count is None:
+            count = self.visible_prompts
+
+        # Continue the current sequence if it isn't all on the stack yet
+        result = self._sequence_prompts(count) if self.current_sequence is not None else []
+        if len(result) == count:
+            return result
+
+        if self.scheduler:
+            return self._scheduled_prompts(count, result)
+
+        # Select among individual prompts and sequence groups based on weights,
+        # without repeating a prompt that is already on screen
+        exclude = self._visible_slots()
+        for prompt in result:
+            exclude.update(self._name_slots(prompt["name"]))
+        prompts_start = len(self.sequence_groups)
+        if self.current_sequence is None:
+            index = self._draw(exclude)
+            if index is None:
+                return result
+            if index < prompts_start:
+                # A sequence was selected, show it first and fill up with prompts after it
+                self._start_sequence(index, len(result))
+                result.extend(self._sequence_prompts(count - len(result)))
+            else:
+                result.append(self.prompts.get(self.slot_ids[index]))
+            exclude.update(self._name_slots(result[-1]["name"]))
+
+        # Select the rest among the prompts only
+        while len(result) < count:
+            index = self._draw(exclude, start=prompts_start)
+            if index is None:
+                break
+            result.append(self.prompts.get(self.slot_ids[index]))
+            exclude.update(self._name_slots(result[-1]["name"]))
+        return result
+
+    def _scheduled_prompts(self, count, result):
+        """Take the next due units from the spaced repetition schedule."""
+        while len(result) < count:
+            key = self.scheduler.next_unit()
+            if key is None:
+                break
+            kind, name = key
+            if kind == "prompt":
+                result.append(self.prompts.first(name))
+            elif self.current_sequence is None:
+                # A sequence group is scheduled as one unit
+                self._start_sequence(self.group_indexes[name], len(result))
+                self.current_group = key
+                result.extend(self._sequence_prompts(count - len(result)))
+            else:
+                # Leave the group until the current sequence is done
+                self.scheduler.put_back(key)
+                break
+        return result
+
+    def _start_sequence(self, index, queued):
+        """Make a sequence group the current sequence.
+
+        queued is the number of prompts picked in this round before the
+        sequence, they are answered before it like the ones on the stack.
+        """
+        self.current_sequence = self.group_prompts[index]
+        self.sequence_position = 0
+        self.sequence_countdown = len(self.displayed_prompts) + queued + len(self.current_sequence)
+        self.group_missed = False
+
+    def _sequence_prompts(self, count):
+        """Take up to count prompts of the current sequence that aren't on the stack yet."""
+        start = self.sequence_position
+        self.sequence_position = min(start + count, len(self.current_sequence))
+        return self.current_sequence[start:self.sequence_position]
+
+    def _finish_sequence(self):
+        """End the current sequence and review its group if it was scheduled."""
+        self.current_sequence = None
+        if self.scheduler and self.current_group:
+            self._review(self.current_group, not self.group_missed)
+        self.current_group = None
+
+    def reset_keys(self):
+        """Forget all held keys, e.g. after events were lost."""
+        self.current_mask = 0
+        self.waiting_for_combination = False
+        self.target_hotkey_mask = 0
+
+    def key_up(self, key_bit):
+        self.current_mask &= ~key_bit
+
+    def key_down(self, key_bit, timestamp=None):
+        """Process a key press and return the change flags it caused.
+
+        timestamp is the perf_counter_ns of the key event, used to measure
+        how long the active prompt took since mark_shown().
+        """
+        if self.current_mask & key_bit:  # Skip if key is already pressed
+            return 0
+
+        self.current_mask |= key_bit
+        self.last_pressed_hotkey = keymap.hotkey_name(self.current_mask)
+
+        if not self.displayed_prompts:  # Skip if no prompts are displayed
+            return KEYS_CHANGED
+
+        # Get the bottom-most prompt
+        current_prompt = self.displayed_prompts[-1]
+        target_mask = self.prompt_mask(current_prompt)
+        is_modifier = key_bit & keymap.MODIFIER_MASK
+
+        # Handle single non-modifier key hotkeys
+        if keymap.is_single_key(target_mask):
+            if self.current_mask & ~keymap.MODIFIER_MASK == key_bit == target_mask:
+                return self._complete(current_prompt, timestamp)
+            elif not key_bit & target_mask and not is_modifier:
+                # Wrong key pressed (ignore modifier keys)
+                return self._miss(current_prompt, timestamp)
+            return KEYS_CHANGED
+
+        # Handle combination hotkeys
+        if not self.waiting_for_combination:
+            if key_bit & target_mask:
+                self.waiting_for_combination = True
+                self.target_hotkey_mask = target_mask
+                self.wrong_attempt = False
+                return KEYS_CHANGED | STACK_CHANGED
+            elif not is_modifier:
+                # Wrong key pressed while not in combination mode (ignore modifier keys)
+                return self._miss(current_prompt, timestamp)
+            return KEYS_CHANGED
+
+        # We are waiting for a combination: check if we've pressed a key that's not in it
+        if self.current_mask & ~self.target_hotkey_mask:
+            self.waiting_for_combination = False
+            self.target_hotkey_mask = 0
+            if not is_modifier:  # Only mark wrong for non-modifier keys
+                return self._miss(current_prompt, timestamp)
+            return KEYS_CHANGED
+
+        # Check if we've completed the correct combination
+        if self.current_mask == self.target_hotkey_mask:
+            self.waiting_for_combination = False
+            self.target_hotkey_mask = 0
+            changes = self._complete(current_prompt, timestamp)
+
+            # If there are still keys held down that match the next prompt's hotkey,
+            # start waiting for that combination immediately
+            if self.displayed_prompts:
+                next_mask = self.prompt_mask(self.displayed_prompts[-1])
+                if self.current_mask & next_mask:
+                    self.waiting_for_combination = True
+                    self.target_hotkey_mask = next_mask
+            return changes
+
+        return KEYS_CHANGED
+
+    def _complete(self, prompt, timestamp=None):
+        """Reward a correct answer and move the stack along."""
+        self.last_reaction_ns = self._elapsed(timestamp)
+        if self.last_reaction_ns is not None:
+            if self.reaction_times.record(prompt["name"], self.last_reaction_ns):
+                # The reference moved, which changes the factor of every prompt
+                # with samples; their slots are brought up to date a chunk per answer
+                self.stale_factors = list(self.reaction_times.stats)
+        self._refresh_factors()
+        if self.attempt_listener:
+            self.attempt_listener(prompt, self.last_pressed_hotkey, True, self.last_reaction_ns)
+        self.activation += 1
+        self.active_since = None
+
+        # Slow answers keep the weight up even when they are correct
+        weight = self.weights[prompt["name"]]
+        self.consecutive_correct[prompt["name"]] += 1
+        if self.consecutive_correct[prompt["name"]] > 2:
+            weight *= 0.8
+        self.set_weight(prompt["name"], weight)
+        self._learned(prompt["name"])
+        if self.scheduler:
+            # Prompts shown as part of a sequence aren't handed out, so this is a no-op for them
+            self._review(("prompt", prompt["name"]), not self.active_missed)
+
+        self.active_missed = False
+        self.wrong_attempt = False
+        self.displayed_prompts.pop()
+        if self.current_sequence is not None:
+            self.sequence_countdown -= 1
+            if self.sequence_countdown <= 0:
+                self._finish_sequence()
+
+        # Add a new prompt at the top if we have room
+        if len(self.displayed_prompts) < self.visible_prompts:
+            next_prompts = self.next_prompts(1)
+            if next_prompts:
+                self.displayed_prompts.insert(0, next_prompts[0])
+
+        return KEYS_CHANGED | STACK_CHANGED | PROMPT_COMPLETED
+
+    def _refresh_factors(self):
+        """Apply the current reaction time reference to the next chunk of stale names."""
+        for _ in range(min(FACTOR_REFRESH_CHUNK, len(self.stale_factors))):
+            name = self.stale_factors.pop()
+            self.set_weight(name, self.weights[name])
+
+    def _miss(self, prompt, timestamp=None):
+        """Penalize a wrong key for the active prompt."""
+        if self.attempt_listener:
+            self.attempt_listener(prompt, self.last_pressed_hotkey, False, self._elapsed(timestamp))
+        self.set_weight(prompt["name"], self.weights[prompt["name"]] * 1.2)
+        self.consecutive_correct[prompt["name"]] = 0
+        self._learned(prompt["name"])
+        self.active_missed = True
+        self.group_missed = True
+        self.wrong_attempt = True
+        return KEYS_CHANGED | STACK_CHANGED | WRONG_ATTEMPT
+
+    def _elapsed(self, timestamp):
+        """Nanoseconds the active prompt has been on screen at timestamp, None if unknown."""
+        if timestamp is None or self.active_since is None or self.shown_activation != self.activation:
+            return None
+        if timestamp <= self.active_since:
+            return None
+        return timestamp - self.active_since
+
+    def _review(self, key, correct):
+        if self.scheduler.review(key, correct) and self.schedule_listener:
+            state = self.scheduler.states[key]
+            self.schedule_listener(key, (state.stability, state.ease, state.reps, state.due), self.scheduler.clock)
+
+    def _learned(self, name):
+        if self.learning_listener:
+            self.learning_listener(name, self.weights[name], self.consecutive_correct[name])
@@ -0,0 +1,127 @@
+"""Attempt history in a local SQLite database.
+
+Next to a deck "name.json" lives "name.history.sqlite3" with one row per
+attempt: which prompt was active, the hotkey it expected, the chord that was
+pressed, whether it was correct and the reaction time. Every run of the
+trainer is a session, so progress can be compared across sessions.
+
+Attempts are queued in O(1) on the keystroke path. A writer thread owns the
+connection and inserts them in batches, one transaction every FLUSH_SECONDS
+at most, so typing never waits for the disk. Indexes on (prompt, time) and
+time keep per-prompt and per-day queries fast over millions of rows.
+"""
+from contextlib import closing
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+FLUSH_SECONDS = 1.0  # Longest time attempts wait in the queue before being written
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    deck TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    session INTEGER NOT NULL REFERENCES sessions(id),
+    time REAL NOT NULL,
+    prompt TEXT NOT NULL,
+    expected TEXT NOT NULL,
+    pressed TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    reaction_ms REAL
+);
+CREATE INDEX IF NOT EXISTS attempts_prompt_time ON attempts(prompt, time);
+CREATE INDEX IF NOT EXISTS attempts_time ON attempts(time);
+"""
+
+
+def history_path(config_path):
+    """Database path belonging to a deck file."""
+    return os.path.splitext(config_path)[0] + ".history.sqlite3"
+
+
+def connect(path, **kwargs):
+    connection = sqlite3.connect(path, **kwargs)
+    connection.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+    connection.execute("PRAGMA synchronous=NORMAL")  # A crash may lose the last batch, never corrupt
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def prompt_summary(path, since=None):
+    """Per prompt (attempts, correct, mean reaction ms) since a Unix time, read from a database."""
+    with closing(sqlite3.connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT prompt, COUNT(*), SUM(correct), AVG(reaction_ms) FROM attempts"
+            " WHERE time >= ? GROUP BY prompt", (since or 0,))
+        return {prompt: (count, correct, reaction) for prompt, count, correct, reaction in rows}
+
+
+def daily_summary(path, prompt=None):
+    """(local day, attempts, correct, mean reaction ms) per day, optionally for one prompt."""
+    query = ("SELECT date(time, 'unixepoch', 'localtime') AS day, COUNT(*), SUM(correct), AVG(reaction_ms)"
+             " FROM attempts {} GROUP BY day ORDER BY day")
+    with closing(sqlite3.connect(path)) as connection:
+        if prompt is None:
+            return connection.execute(query.format("")).fetchall()
+        return connection.execute(query.format("WHERE prompt = ?"), (prompt,)).fetchall()
+
+
+class AttemptHistory:
+    """Writes the attempts of one session to a deck's history database."""
+
+    def __init__(self, config_path):
+        self.path = history_path(config_path)
+        self.attempts = queue.SimpleQueue()
+        self.error = None  # Last write error; training goes on regardless
+        self.written = 0
+        # Opened here so a broken database is reported right away, then used by the writer thread only
+        self.connection = connect(self.path, check_same_thread=False)
+        self.session = self.connection.execute(
+            "INSERT INTO sessions (started, deck) VALUES (?, ?)",
+            (time.time(), os.path.abspath(config_path))).lastrowid
+        self.connection.commit()
+        self.thread = threading.Thread(target=self._run, name="attempt-history", daemon=True)
+        self.thread.start()
+
+    def record(self, prompt, pressed, correct, reaction_ns):
+        """Queue one attempt, safe to call on the keystroke path."""
+        self.attempts.put((time.time(), prompt["name"], prompt["hotkey"], pressed, int(correct),
+                           None if reaction_ns is None else reaction_ns / 1e6))
+
+    def close(self):
+        """Write the queued attempts and stop the writer thread."""
+        self.attempts.put(None)
+        self.thread.join()
+
+    def _run(self):
+        closed = False
+        while not closed:
+            batch = [self.attempts.get()]
+            deadline = time.monotonic() + FLUSH_SECONDS
+            while batch[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.attempts.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                closed = True
+            try:
+                with self.connection:
+                    self.connection.executemany(
+                        "INSERT INTO attempts (session, time, prompt, expected, pressed, correct, reaction_ms)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(self.session,) + attempt for attempt in batch])
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                self.error = e
+        self.connection.close()
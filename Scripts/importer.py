@@ -0,0 +1,163 @@
+"""Bulk import of prompts from cheat sheets and editor keymaps.
+
+Supported sources:
+
+- CSV/TSV: one shortcut per row as name, hotkey and an optional weight, or
+  any column order with a header row (name/command/action, hotkey/key/
+  shortcut, weight). The delimiter is guessed unless the file ends in .tsv.
+  Rows are streamed, so the file is never held in memory as a whole.
+- JSON: VS Code keybindings.json (comments and trailing commas allowed),
+  a list of {"name", "hotkey"} objects or a trainer configuration.
+
+Every hotkey goes through keymap.canonical_hotkey, the same rules the trainer
+uses for captured keys. Duplicates of each other or of the current deck are
+dropped, as are multi-step chords like "ctrl+k ctrl+c" that can't be trained.
+"""
+import csv
+import json
+import math
+import os
+import re
+
+import keymap
+
+NAME_COLUMNS = ("name", "command", "action", "description", "prompt")
+HOTKEY_COLUMNS = ("hotkey", "key", "keys", "shortcut", "keybinding", "binding")
+WEIGHT_COLUMNS = ("weight",)
+
+# Strings are matched first so comment markers and commas inside them are left alone
+_JSONC_COMMENTS = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_JSONC_TRAILING_COMMAS = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[\]}])')
+_FUNCTION_KEY = re.compile(r"f\d{1,2}")
+
+
+def import_file(path, existing=()):
+    """Read a shortcut file into new prompt dictionaries.
+
+    existing are the prompts already in the deck, used for deduplication.
+    Returns (prompts, counts) with counts of the rows that were "read",
+    dropped as "duplicates" and "skipped" for lacking a usable name or hotkey.
+    Raises OSError or ValueError if the file can't be read.
+    """
+    return build_prompts(read_rows(path), existing)
+
+
+def read_rows(path):
+    """Yield (name, hotkey, weight) rows from a file, picking the reader by extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        return iter_json(path)
+    return iter_csv(path, delimiter="\t" if extension in (".tsv", ".tab") else None)
+
+
+def iter_csv(path, delimiter=None):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if delimiter is None:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+            except csv.Error:
+                delimiter = ","
+        reader = csv.reader(f, delimiter=delimiter)
+        columns = None
+        try:
+            for row in reader:
+                if not any(cell.strip() for cell in row):
+                    continue
+                if columns is None:
+                    columns = _header_columns(row)
+                    if columns:
+                        continue
+                    columns = (0, 1, 2)  # No header: name, hotkey, weight
+                yield tuple(row[i] if i is not None and i < len(row) else None for i in columns)
+        except csv.Error as e:
+            raise ValueError(f"{path}, line {reader.line_num}: {e}") from e
+
+
+def _header_columns(row):
+    """Column indexes of name, hotkey and weight if row is a header, else None."""
+    cells = [cell.strip().lower() for cell in row]
+
+    def find(names):
+        return next((i for i, cell in enumerate(cells) if cell in names), None)
+
+    name, hotkey = find(NAME_COLUMNS), find(HOTKEY_COLUMNS)
+    if name is None or hotkey is None:
+        return None
+    return name, hotkey, find(WEIGHT_COLUMNS)
+
+
+def iter_json(path):
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+    text = _JSONC_COMMENTS.sub(lambda m: m.group(1) or "", text)
+    data = json.loads(_JSONC_TRAILING_COMMAS.sub(lambda m: m.group(1) or m.group(2), text))
+    if isinstance(data, dict):
+        data = data.get("prompts", [])  # A trainer configuration
+    if not isinstance(data, list):
+        raise ValueError(f"{path} doesn't contain a list of shortcuts")
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        if "command" in entry:
+            command = entry["command"]
+            if not isinstance(command, str) or command.startswith("-"):
+                continue  # "-command" entries remove a default binding
+            yield command, entry.get("key"), None
+        else:
+            yield entry.get("name"), entry.get("hotkey"), entry.get("weight")
+
+
+def build_prompts(rows, existing=()):
+    """Normalize and deduplicate (name, hotkey, weight) rows into prompt dictionaries."""
+    seen = {(prompt["name"], keymap.canonical_hotkey(prompt["hotkey"])) for prompt in existing}
+    counts = {"read": 0, "duplicates": 0, "skipped": 0}
+    prompts = []
+    for name, hotkey, weight in rows:
+        counts["read"] += 1
+        name = name.strip() if isinstance(name, str) else ""
+        hotkey = hotkey.strip() if isinstance(hotkey, str) else ""
+        if not name or not hotkey or _is_chord_sequence(hotkey):
+            counts["skipped"] += 1  # Missing, or a sequence of several chords
+            continue
+        hotkey = keymap.canonical_hotkey(hotkey)
+        if (name, hotkey) in seen:
+            counts["duplicates"] += 1
+            continue
+        seen.add((name, hotkey))
+        prompts.append({"name": name, "hotkey": hotkey, "weight": _parse_weight(weight)})
+    return prompts, counts
+
+
+def _is_key_name(key):
+    """Whether key is a key name keymap knows, in any of its spellings."""
+    return (len(key) == 1 or key in keymap.MODIFIERS or key in keymap.MODIFIER_MAP
+            or key in keymap.KEY_MAP or key in keymap.KEY_MAP.values()
+            or _FUNCTION_KEY.fullmatch(key) is not None)
+
+
+def _is_chord_of_known_keys(hotkey):
+    return all(_is_key_name(key) for key in keymap.split_hotkey(hotkey))
+
+
+def _is_chord_sequence(hotkey):
+    """Whether hotkey is several chords pressed one after another, like "ctrl+k ctrl+c".
+
+    Key names may contain spaces themselves ("page down", "left ctrl"), so
+    only hotkeys whose space separated steps are all chords of known keys
+    count as sequences.
+    """
+    hotkey = "+".join(part.strip() for part in hotkey.lower().split("+"))
+    steps = hotkey.split()
+    if len(steps) < 2 or _is_chord_of_known_keys(hotkey):
+        return False
+    return all(_is_chord_of_known_keys(step) for step in steps)
+
+
+def _parse_weight(weight):
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        return 1.0
+    return weight if math.isfinite(weight) and weight > 0 else 1.0  # inf would poison the sampler
@@ -0,0 +1,158 @@
+"""Persistent learning progress: an append-only journal plus snapshots.
+
+Next to a deck "name.json" live two files:
+
+    name.progress.json  snapshot {"version": 2, "prompts": {prompt name:
+                        [weight, consecutive correct]}, "clock": spaced
+                        repetition clock, "units": [[kind, name, stability,
+                        ease, reps, due], ...]}
+    name.progress.log   one JSON line per change, either
+                        [name, weight, consecutive correct] or
+                        {"unit": [kind, name, stability, ease, reps, due], "clock": clock}
+
+Snapshots without a version are the {prompt name: [weight, consecutive
+correct]} of older versions. Records hold absolute values, so replaying a record twice is harmless. At
+startup the snapshot is read, the log replayed on top and both are
+compacted into a fresh snapshot with an empty log. While training, records
+are queued in O(1) and appended by a writer thread, which compacts again
+every COMPACT_RECORDS records, so the log never grows past that.
+"""
+import json
+import os
+import queue
+import threading
+
+from autosave import write_atomic
+
+COMPACT_RECORDS = 10000  # Log records between snapshots
+
+
+def progress_paths(config_path):
+    """Snapshot and log paths belonging to a deck file."""
+    base = os.path.splitext(config_path)[0]
+    return base + ".progress.json", base + ".progress.log"
+
+
+def snapshot_data(state, schedule):
+    """The version 2 snapshot of a learning state and schedule, ready for json.dump."""
+    clock, units = schedule
+    return {
+        "version": 2,
+        "prompts": state,
+        "clock": clock,
+        "units": [[*key, *unit_state] for key, unit_state in units.items()],
+    }
+
+
+def parse_snapshot(snapshot):
+    """Learning state and schedule of a loaded snapshot, see load_progress."""
+    if snapshot.get("version") == 2:
+        state = {name: tuple(values) for name, values in snapshot["prompts"].items()}
+        units = {(kind, name): tuple(values) for kind, name, *values in snapshot["units"]}
+        return state, (snapshot["clock"], units)
+    return {name: tuple(values) for name, values in snapshot.items()}, (0, {})
+
+
+def load_progress(config_path):
+    """Read the progress saved for a deck.
+
+    Returns (learning state, schedule): {name: (weight, consecutive correct)}
+    and (clock, {unit key: (stability, ease, reps, due)}).
+    """
+    snapshot_path, log_path = progress_paths(config_path)
+    state = {}
+    clock = 0
+    units = {}
+    try:
+        with open(snapshot_path, encoding="utf-8") as f:
+            state, (clock, units) = parse_snapshot(json.load(f))
+    except FileNotFoundError:
+        pass
+    try:
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Torn last record after a crash
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    kind, name, *values = record["unit"]
+                    units[(kind, name)] = tuple(values)
+                    clock = record["clock"]
+                else:
+                    name, weight, correct = record
+                    state[name] = (weight, correct)
+    except FileNotFoundError:
+        pass
+    return state, (clock, units)
+
+
+class LearningJournal:
+    """Appends learning state changes of one deck from a background thread."""
+
+    def __init__(self, config_path, state, schedule=(0, {})):
+        self.snapshot_path, self.log_path = progress_paths(config_path)
+        # Mirror of the saved state, only touched by the writer thread
+        self.state = dict(state)
+        self.clock = schedule[0]
+        self.units = dict(schedule[1])
+        self.records = queue.SimpleQueue()
+        self.error = None  # Last write error; progress is kept in memory regardless
+        self.log = None
+        self._compact()  # Start from one snapshot and an empty log
+        self.thread = threading.Thread(target=self._run, name="learning-journal", daemon=True)
+        self.thread.start()
+
+    def record(self, name, weight, correct):
+        """Queue one change, safe to call on the keystroke path."""
+        self.records.put((name, weight, correct))
+
+    def record_unit(self, key, unit_state, clock):
+        """Queue one spaced repetition review, safe to call on the keystroke path."""
+        self.records.put((key, unit_state, clock))
+
+    def close(self):
+        """Write the queued records and stop the writer thread."""
+        self.records.put(None)
+        self.thread.join()
+
+    def _run(self):
+        appended = 0
+        while True:
+            batch = [self.records.get()]
+            try:
+                while True:
+                    batch.append(self.records.get_nowait())
+            except queue.Empty:
+                pass
+
+            lines = []
+            for record in batch:
+                if record is None:
+                    continue
+                if isinstance(record[0], tuple):  # Unit keys are (kind, name)
+                    key, unit_state, self.clock = record
+                    self.units[key] = unit_state
+                    lines.append(json.dumps({"unit": [*key, *unit_state], "clock": self.clock}) + "\n")
+                else:
+                    self.state[record[0]] = record[1:]
+                    lines.append(json.dumps(record) + "\n")
+            try:
+                self.log.write("".join(lines))
+                self.log.flush()
+                appended += len(lines)
+                if appended >= COMPACT_RECORDS:
+                    self._compact()
+                    appended = 0
+            except OSError as e:
+                self.error = e
+            if None in batch:
+                self.log.close()
+                return
+
+    def _compact(self):
+        """Write the whole state as a snapshot, then empty the log."""
+        snapshot = snapshot_data(self.state, (self.clock, self.units))
+        write_atomic(self.snapshot_path, lambda f: json.dump(snapshot, f))
+        if self.log:
+            self.log.close()
+        self.log = open(self.log_path, "w", encoding="utf-8")
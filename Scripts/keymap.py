@@ -0,0 +1,219 @@
+"""Key normalization, key IDs and hotkey bitmasks used for chord matching.
+
+Every normalized key name gets its own bit, so a hotkey like "ctrl+shift+s"
+becomes a single integer and the held keys can be tracked the same way.
+Raw keyboard events are resolved to their bit through one lookup table keyed
+by (scan_code, name); the string normalization only runs for unseen keys.
+"""
+
+MODIFIERS = ('alt', 'ctrl', 'shift', 'win')
+
+# Key mapping for normalization
+MODIFIER_MAP = {
+    # Ctrl variants
+    'left ctrl': 'ctrl', 'right ctrl': 'ctrl', 'control_l': 'ctrl', 'control_r': 'ctrl', 'control': 'ctrl',
+    'strg': 'ctrl',  # German
+    # Alt variants
+    'left alt': 'alt', 'right alt': 'alt', 'alt_l': 'alt', 'alt_r': 'alt', 'alt': 'alt',
+    'alt gr': 'alt', 'altgr': 'alt', 'alt_graph': 'alt',  # AltGr variants
+    # Shift variants
+    'left shift': 'shift', 'right shift': 'shift', 'shift_l': 'shift', 'shift_r': 'shift', 'shift': 'shift',
+    'umschalt': 'shift',  # German
+    # Windows/Super/Meta variants
+    'left windows': 'win', 'right windows': 'win', 'windows': 'win', 'win_l': 'win', 'win_r': 'win',
+    'super_l': 'win', 'super_r': 'win', 'super': 'win',
+    'meta_l': 'win', 'meta_r': 'win', 'meta': 'win',
+    'cmd': 'win', 'command': 'win',  # macOS keymap exports
+}
+
+# Common key name normalizations
+KEY_MAP = {
+    # Special characters
+    'minus': '-', 'plus': '+', 'comma': ',', 'period': '.', 'dot': '.',
+    'slash': '/', 'backslash': '\\', 'semicolon': ';', 'colon': ':',
+    'bracketleft': '[', 'bracketright': ']', 'braceleft': '{', 'braceright': '}',
+    'parenleft': '(', 'parenright': ')', 'equal': '=', 'quotedbl': '"',
+    'apostrophe': "'", 'grave': '`', 'asciitilde': '~', 'numbersign': '#',
+    'dollar': '$', 'percent': '%', 'ampersand': '&', 'asterisk': '*',
+    'question': '?', 'exclaim': '!', 'at': '@', 'asciicircum': '^',
+    'underscore': '_', 'space': 'space',
+    # Function keys
+    'f1': 'f1', 'f2': 'f2', 'f3': 'f3', 'f4': 'f4', 'f5': 'f5',
+    'f6': 'f6', 'f7': 'f7', 'f8': 'f8', 'f9': 'f9', 'f10': 'f10',
+    'f11': 'f11', 'f12': 'f12',
+    # Navigation keys
+    'return': 'enter', 'enter': 'enter',
+    'escape': 'esc', 'esc': 'esc',
+    'tab': 'tab',
+    'backspace': 'backspace',
+    'delete': 'del', 'del': 'del',
+    'insert': 'ins', 'ins': 'ins',
+    'home': 'home', 'end': 'end',
+    'pageup': 'pgup', 'pgup': 'pgup', 'prior': 'pgup',
+    'pagedown': 'pgdn', 'pgdn': 'pgdn', 'next': 'pgdn',
+    'up': 'up', 'down': 'down', 'left': 'left', 'right': 'right',
+    # German specific
+    'adiaeresis': 'ä', 'odiaeresis': 'ö', 'udiaeresis': 'ü',
+    'ssharp': 'ß',
+    # Number pad
+    'kp_0': '0', 'kp_1': '1', 'kp_2': '2', 'kp_3': '3', 'kp_4': '4',
+    'kp_5': '5', 'kp_6': '6', 'kp_7': '7', 'kp_8': '8', 'kp_9': '9',
+    'kp_decimal': '.', 'kp_divide': '/', 'kp_multiply': '*',
+    'kp_subtract': '-', 'kp_add': '+', 'kp_enter': 'enter',
+}
+
+# Shifted numbers and symbols
+SHIFT_MAP = {
+    '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
+    '6': '^', '7': '&', '8': '*', '9': '(', '0': ')',
+    '-': '_', '=': '+', '[': '{', ']': '}', '\\': '|',
+    ';': ':', "'": '"', ',': '<', '.': '>', '/': '?',
+    '`': '~'
+}
+
+# Modifiers always own the lowest bits so they can be masked out cheaply
+MODIFIER_MASK = (1 << len(MODIFIERS)) - 1
+
+_key_bits = {name: 1 << i for i, name in enumerate(MODIFIERS)}  # Key name -> bit
+_key_names = list(MODIFIERS)  # Bit position -> key name
+_hotkey_names = {}  # Cache of mask -> hotkey string
+_event_bits = {}  # (scan_code, raw event name) -> key bit
+
+
+def normalize_key(key):
+    """Normalize key names to handle modifiers and special keys consistently."""
+    key = str(key).lower()
+    
+    # Handle shift + key combinations for special characters
+    if key.startswith('shift+'):
+        base_key = key[6:]  # Remove 'shift+'
+        if base_key in SHIFT_MAP:
+            return SHIFT_MAP[base_key]
+    
+    # Check modifier map first, then key map
+    if key in MODIFIER_MAP:
+        return MODIFIER_MAP[key]
+    if key in KEY_MAP:
+        return KEY_MAP[key]
+    
+    # If no special mapping exists, return the key as is
+    return key
+
+
+def key_bit(key):
+    """Return the bit for a normalized key name, assigning a new one if needed."""
+    bit = _key_bits.get(key)
+    if bit is None:
+        bit = 1 << len(_key_names)
+        _key_bits[key] = bit
+        _key_names.append(key)
+    return bit
+
+
+def event_key_bit(scan_code, name):
+    """Resolve a raw keyboard event to its key bit.
+    
+    Known (scan_code, name) pairs are a single dict lookup; anything else goes
+    through normalize_key once and is remembered.
+    """
+    event_key = (scan_code, name)
+    bit = _event_bits.get(event_key)
+    if bit is None:
+        bit = _event_bits[event_key] = key_bit(normalize_key(name))
+    return bit
+
+
+def _lookup_scan_codes(name, scan_codes_for):
+    """Get the scan codes of a raw key name, or nothing if the platform can't map it."""
+    try:
+        return scan_codes_for(name, False)
+    except (ValueError, KeyError, OSError, ImportError):
+        return ()
+
+
+def build_key_table(scan_codes_for):
+    """Pre-fill the event lookup table for every key name we know about.
+    
+    scan_codes_for maps a key name to its scan codes, e.g.
+    keyboard.key_to_scan_codes. Names the platform can't map are skipped and
+    will be resolved on first use instead.
+    """
+    names = set(MODIFIER_MAP) | set(KEY_MAP) | set(SHIFT_MAP.values())
+    names.update('abcdefghijklmnopqrstuvwxyz0123456789')
+    for name in names:
+        for scan_code in _lookup_scan_codes(name, scan_codes_for):
+            event_key_bit(scan_code, name)
+
+
+def raw_key_names(key):
+    """Return the raw key names that normalize to a normalized key name."""
+    names = {key}
+    names.update(raw for raw, normalized in MODIFIER_MAP.items() if normalized == key)
+    names.update(raw for raw, normalized in KEY_MAP.items() if normalized == key)
+    # Shifted symbols are reported on the scan code of their unshifted key
+    names.update(base for base, shifted in SHIFT_MAP.items() if shifted == key)
+    return names
+
+
+def key_scan_codes(key, scan_codes_for):
+    """Collect every scan code that can produce a normalized key name."""
+    scan_codes = set()
+    for name in raw_key_names(key):
+        scan_codes.update(_lookup_scan_codes(name, scan_codes_for))
+    return scan_codes
+
+
+def split_hotkey(hotkey):
+    """Split a hotkey string into key names, keeping a literal '+' key intact."""
+    parts = hotkey.split('+')
+    if '' not in parts:
+        return parts
+    # Empty parts only appear around a '+' key, e.g. "ctrl++" or "ctrl+++a"
+    return [p for p in parts if p] + ['+']
+
+
+def format_hotkey(keys):
+    """Join key names into a hotkey string, modifiers first."""
+    modifiers = sorted(k for k in keys if k in MODIFIERS)
+    other_keys = sorted(k for k in keys if k not in MODIFIERS)
+    return '+'.join(modifiers + other_keys)
+
+
+def canonical_hotkey(hotkey):
+    """Normalize a hotkey typed or exported elsewhere, e.g. "Shift + Ctrl+P" -> "ctrl+shift+p"."""
+    hotkey = '+'.join(part.strip() for part in hotkey.split('+'))
+    return format_hotkey({normalize_key(k) for k in split_hotkey(hotkey)})
+
+
+def compile_hotkey(hotkey):
+    """Compile a hotkey string into its key bitmask."""
+    mask = 0
+    for key in split_hotkey(hotkey):
+        mask |= key_bit(key)
+    return mask
+
+
+def mask_keys(mask):
+    """Return the key names set in a mask."""
+    keys = []
+    position = 0
+    while mask:
+        if mask & 1:
+            keys.append(_key_names[position])
+        mask >>= 1
+        position += 1
+    return keys
+
+
+def hotkey_name(mask):
+    """Return the hotkey string for a mask of held keys."""
+    name = _hotkey_names.get(mask)
+    if name is None:
+        name = format_hotkey(mask_keys(mask))
+        _hotkey_names[mask] = name
+    return name
+
+
+def is_single_key(mask):
+    """Check if a mask is exactly one non-modifier key."""
+    return not mask & MODIFIER_MASK and mask & (mask - 1) == 0
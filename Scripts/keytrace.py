@@ -0,0 +1,367 @@
+"""Record raw keyboard event traces and replay them through the engine.
+
+A trace is a compact binary log of every key event the trainer processed, so
+real sessions (auto-repeat floods, chords rolling into each other) can be fed
+through TrainerEngine again to compare throughput and latency between
+versions.
+
+File layout (little endian):
+
+    header:  b"HKTR", version (B), rng seed (Q)
+    records: kind (B) followed by
+             NAME:  name id (H), length (B), utf-8 bytes
+             DOWN/UP: perf_counter_ns timestamp (q), scan code (i), name id (H)
+             SHOWN: perf_counter_ns timestamp (q) at which the stack was drawn
+             PREFETCH: perf_counter_ns timestamp (q) of an idle-time batch draw
+             PROGRESS: perf_counter_ns timestamp (q), length (I), utf-8 JSON
+                       snapshot of the learning progress (see journal)
+
+Key names are written once as NAME records and referenced by id afterwards.
+SHOWN records (version 2) carry the times reaction times are measured from,
+so replays weigh prompts exactly like the session did. Version 1 traces
+don't have them, the stack then counts as drawn at the key event that
+changed it. PREFETCH records (version 3) mark where the trainer drew a batch
+of upcoming prompts while idle; replays draw theirs at the same points.
+A PROGRESS record (version 4) holds the learning progress a deck was loaded
+with. The journal next to the deck keeps changing while the session is
+recorded, so replays start from the recorded progress instead.
+
+Usage: python keytrace.py replay TRACE DECK.json [--realtime] [--seed N]
+       python keytrace.py check DECK.json [--answers N] [--seed N]
+
+check records a simulated session the way the trainer does (shown times lag
+behind the key events like a redraw, batches are prefetched at random idle
+points, progress is journaled next to a copy of the deck) and replays it, to make sure a replay
+picks the same prompts as the session it was recorded from.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import time
+
+from journal import LearningJournal, load_progress, parse_snapshot, progress_paths, snapshot_data
+import keymap
+from engine import TrainerEngine, STACK_CHANGED, PROMPT_COMPLETED, WRONG_ATTEMPT
+
+MAGIC = b"HKTR"
+VERSION = 4
+
+# Event types, same strings as keyboard.KEY_DOWN / keyboard.KEY_UP
+KEY_DOWN = "down"
+KEY_UP = "up"
+SHOWN = "shown"  # Event type of SHOWN records
+PREFETCH = "prefetch"  # Event type of PREFETCH records
+PROGRESS = "progress"  # Event type of PROGRESS records
+
+_NAME, _DOWN, _UP, _SHOWN, _PREFETCH, _PROGRESS = 0, 1, 2, 3, 4, 5
+
+_HEADER = struct.Struct("<4sBQ")
+_KIND = struct.Struct("<B")
+_NAME_RECORD = struct.Struct("<HB")
+_EVENT_RECORD = struct.Struct("<qiH")
+_SHOWN_RECORD = struct.Struct("<q")  # Also used by PREFETCH records
+_PROGRESS_RECORD = struct.Struct("<qI")
+
+
+class TraceRecorder:
+    """Append key events to a binary trace file."""
+
+    def __init__(self, path, seed):
+        self.file = open(path, "wb")
+        self.file.write(_HEADER.pack(MAGIC, VERSION, seed))
+        self.name_ids = {}
+
+    def record(self, timestamp, event_type, name, scan_code):
+        name = name or ""
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.name_ids)
+            encoded = name.encode("utf-8")[:255]
+            self.file.write(_KIND.pack(_NAME) + _NAME_RECORD.pack(name_id, len(encoded)) + encoded)
+        kind = _DOWN if event_type == KEY_DOWN else _UP
+        scan_code = -1 if scan_code is None else scan_code
+        self.file.write(_KIND.pack(kind) + _EVENT_RECORD.pack(timestamp, scan_code, name_id))
+
+    def record_shown(self, timestamp):
+        """Note that the prompt stack was drawn, see TrainerEngine.mark_shown."""
+        self.file.write(_KIND.pack(_SHOWN) + _SHOWN_RECORD.pack(timestamp))
+
+    def record_prefetch(self, timestamp):
+        """Note that a batch was drawn, see TrainerEngine.prefetch."""
+        self.file.write(_KIND.pack(_PREFETCH) + _SHOWN_RECORD.pack(timestamp))
+
+    def record_progress(self, timestamp, state, schedule):
+        """Note the learning progress a deck starts from, see TrainerEngine.learning_state."""
+        encoded = json.dumps(snapshot_data(state, schedule)).encode("utf-8")
+        self.file.write(_KIND.pack(_PROGRESS) + _PROGRESS_RECORD.pack(timestamp, len(encoded)) + encoded)
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    """Read a trace file, returns (seed, events) with events as
+    (timestamp, event_type, name, scan_code) tuples, name and scan_code
+    are None for SHOWN and PREFETCH events. For PROGRESS events name is
+    the (learning state, schedule) pair, see trace_progress."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, seed = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or not 1 <= version <= VERSION:
+        raise ValueError(f"{path} is not a version 1 to {VERSION} key trace")
+
+    names = {}
+    events = []
+    offset = _HEADER.size
+    while offset < len(data):
+        kind = data[offset]
+        offset += _KIND.size
+        if kind == _NAME:
+            name_id, length = _NAME_RECORD.unpack_from(data, offset)
+            offset += _NAME_RECORD.size
+            names[name_id] = data[offset:offset + length].decode("utf-8")
+            offset += length
+        elif kind in (_SHOWN, _PREFETCH):
+            timestamp, = _SHOWN_RECORD.unpack_from(data, offset)
+            offset += _SHOWN_RECORD.size
+            events.append((timestamp, SHOWN if kind == _SHOWN else PREFETCH, None, None))
+        elif kind == _PROGRESS:
+            timestamp, length = _PROGRESS_RECORD.unpack_from(data, offset)
+            offset += _PROGRESS_RECORD.size
+            progress = parse_snapshot(json.loads(data[offset:offset + length].decode("utf-8")))
+            offset += length
+            events.append((timestamp, PROGRESS, progress, None))
+        else:
+            timestamp, scan_code, name_id = _EVENT_RECORD.unpack_from(data, offset)
+            offset += _EVENT_RECORD.size
+            event_type = KEY_DOWN if kind == _DOWN else KEY_UP
+            events.append((timestamp, event_type, names[name_id], None if scan_code == -1 else scan_code))
+    return seed, events
+
+
+def trace_progress(events):
+    """The (learning state, schedule) the recorded deck started from, or None for older traces."""
+    for _, event_type, progress, _ in events:
+        if event_type == PROGRESS:
+            return progress
+    return None
+
+
+def replay(engine, events, realtime=False):
+    """Feed recorded events through an engine.
+
+    The engine should start from the recorded progress, see load_engine.
+    As fast as possible by default, or at the original pace with realtime.
+    Returns a dict with counts, total time, per-event latencies in ns and
+    the IDs of the answered prompts in order.
+    """
+    completed = wrong = 0
+    latencies = []
+    answered = []
+    start = time.perf_counter_ns()
+    first_timestamp = events[0][0] if events else 0
+    shown_recorded = any(event_type == SHOWN for _, event_type, _, _ in events)
+    if not shown_recorded:
+        engine.mark_shown(first_timestamp)
+    for timestamp, event_type, name, scan_code in events:
+        if realtime:
+            due = start + (timestamp - first_timestamp)
+            delay = due - time.perf_counter_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        if event_type == SHOWN:
+            engine.mark_shown(timestamp)
+            continue
+        if event_type == PREFETCH:
+            engine.prefetch()
+            continue
+        if event_type == PROGRESS:
+            continue  # Restored by load_engine
+        active = engine.displayed_prompts[-1] if engine.displayed_prompts else None
+        begin = time.perf_counter_ns()
+        key_bit = keymap.event_key_bit(scan_code, name)
+        if event_type == KEY_DOWN:
+            changes = engine.key_down(key_bit, timestamp)
+            if changes & STACK_CHANGED and not shown_recorded:
+                engine.mark_shown(timestamp)  # The GUI would redraw right away
+            if changes & PROMPT_COMPLETED:
+                completed += 1
+                answered.append(active["id"])
+            if changes & WRONG_ATTEMPT:
+                wrong += 1
+        else:
+            engine.key_up(key_bit)
+        latencies.append(time.perf_counter_ns() - begin)
+    return {
+        "events": len(latencies),
+        "seconds": (time.perf_counter_ns() - start) / 1e9,
+        "completed": completed,
+        "wrong": wrong,
+        "latencies": latencies,
+        "answered": answered,
+    }
+
+
+def record_session(engine, recorder, answers, rng):
+    """Answer prompts like a user would, feeding and recording events like the trainer.
+
+    Every prompt gets a wrong key now and then, the stack is marked as
+    shown some time after the event that changed it, as after a redraw, and
+    batches are prefetched at random points, as when the trainer is idle.
+    Returns the IDs of the answered prompts in order.
+    """
+    timestamp = time.perf_counter_ns()
+    answered = []
+
+    def shown():
+        nonlocal timestamp
+        timestamp += rng.randrange(1_000_000, 20_000_000)
+        engine.mark_shown(timestamp)
+        recorder.record_shown(timestamp)
+
+    def idle():
+        if rng.random() < 0.3 and engine.prefetch():
+            recorder.record_prefetch(timestamp)
+
+    def press(name):
+        nonlocal timestamp
+        key_bit = keymap.event_key_bit(None, name)
+        timestamp += rng.randrange(50_000_000, 1_500_000_000)
+        recorder.record(timestamp, KEY_DOWN, name, None)
+        changes = engine.key_down(key_bit, timestamp)
+        timestamp += rng.randrange(1_000_000, 100_000_000)
+        recorder.record(timestamp, KEY_UP, name, None)
+        engine.key_up(key_bit)
+        if changes & STACK_CHANGED:
+            shown()
+        idle()
+        return changes
+
+    shown()
+    while len(answered) < answers and engine.displayed_prompts:
+        prompt = engine.displayed_prompts[-1]
+        if rng.random() < 0.15:
+            press("f24" if "f24" not in prompt["hotkey"] else "f23")
+        keys = keymap.split_hotkey(prompt["hotkey"])
+        bits = [keymap.key_bit(key) for key in keys]
+        for key in keys:  # Hold the chord, modifiers first
+            timestamp += rng.randrange(10_000_000, 200_000_000)
+            recorder.record(timestamp, KEY_DOWN, key, None)
+            changes = engine.key_down(keymap.event_key_bit(None, key), timestamp)
+        for key, bit in zip(keys, bits):
+            timestamp += rng.randrange(1_000_000, 100_000_000)
+            recorder.record(timestamp, KEY_UP, key, None)
+            engine.key_up(bit)
+        if changes & PROMPT_COMPLETED:
+            answered.append(prompt["id"])
+        if changes & STACK_CHANGED:
+            shown()
+        idle()
+    return answered
+
+
+def check(deck_path, seed, answers, restore=True):
+    """Record a simulated session and replay it, returns True if both answered the same prompts."""
+    with tempfile.TemporaryDirectory() as directory:
+        # Train on a copy so the progress saved next to the deck isn't touched
+        copy_path = os.path.join(directory, os.path.basename(deck_path))
+        shutil.copyfile(deck_path, copy_path)
+        for path, copy in zip(progress_paths(deck_path), progress_paths(copy_path)):
+            if os.path.exists(path):
+                shutil.copyfile(path, copy)
+        trace_path = os.path.join(directory, "check.trace")
+        recorder = TraceRecorder(trace_path, seed)
+        engine = load_engine(copy_path, seed, restore)
+        # Journal like the trainer does, so the saved progress moves on during the session
+        journal = LearningJournal(copy_path, engine.learning_state(), engine.schedule_state())
+        engine.learning_listener = journal.record
+        engine.schedule_listener = journal.record_unit
+        recorder.record_progress(time.perf_counter_ns(), engine.learning_state(), engine.schedule_state())
+        live = record_session(engine, recorder, answers, random.Random(seed))
+        journal.close()
+        recorder.close()
+        trace_seed, events = read_trace(trace_path)
+        replayed = replay(load_engine(copy_path, trace_seed, progress=trace_progress(events)), events)["answered"]
+    same = sum(1 for a, b in zip(live, replayed) if a == b)
+    print(f"{len(live)} answers recorded, {len(replayed)} replayed, {same} with the same prompt")
+    if live != replayed:
+        first = next((i for i, (a, b) in enumerate(zip(live, replayed)) if a != b), min(len(live), len(replayed)))
+        print(f"first difference at answer {first}")
+        return False
+    return True
+
+
+def load_engine(deck_path, seed, restore=True, progress=None):
+    """Create an engine with a seeded RNG and the deck from a JSON config.
+
+    progress is a (learning state, schedule) pair to start from, usually
+    the one recorded in a trace. Without it the learning progress saved next
+    to the deck is restored like the trainer does, unless restore is False.
+    """
+    with open(deck_path, "r") as f:
+        config = json.load(f)
+    engine = TrainerEngine(rng=random.Random(seed))
+    dangling_names = engine.load_deck(config["prompts"], config["visible_prompts"],
+                                      config.get("sequence_groups", []))
+    for group, names in dangling_names.items():
+        print(f"warning: sequence group {group!r} references unknown prompts: {', '.join(names)}")
+    engine.set_spaced_repetition(config.get("spaced_repetition", False))
+    if progress is None and restore:
+        progress = load_progress(deck_path)
+    if progress is not None:
+        learning, schedule = progress
+        engine.restore_learning(learning)
+        engine.restore_schedule(schedule)
+    engine.ensure_prompts()
+    return engine
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded key trace through the engine.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay")
+    replay_parser.add_argument("trace")
+    replay_parser.add_argument("deck", help="JSON configuration the trace was recorded with")
+    replay_parser.add_argument("--seed", type=int, help="override the seed stored in the trace")
+    replay_parser.add_argument("--realtime", action="store_true", help="keep the original pace")
+    replay_parser.add_argument("--fresh", action="store_true",
+                               help="start from fresh weights instead of the progress recorded in the trace")
+    check_parser = subparsers.add_parser("check", help="check that replays pick the prompts of the session")
+    check_parser.add_argument("deck", help="JSON configuration to train with")
+    check_parser.add_argument("--seed", type=int, default=0)
+    check_parser.add_argument("--answers", type=int, default=500)
+    check_parser.add_argument("--fresh", action="store_true",
+                              help="start from fresh weights instead of the progress saved next to the deck")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        raise SystemExit(0 if check(args.deck, args.seed, args.answers, restore=not args.fresh) else 1)
+
+    seed, events = read_trace(args.trace)
+    progress = None if args.fresh else trace_progress(events)
+    if progress is None and not args.fresh:
+        print("warning: the trace doesn't record the starting progress, using the progress saved next to the deck")
+    engine = load_engine(args.deck, seed if args.seed is None else args.seed,
+                         restore=not args.fresh, progress=progress)
+    result = replay(engine, events, realtime=args.realtime)
+
+    latencies = sorted(result["latencies"]) or [0]
+    print(f"{result['events']} events in {result['seconds']:.3f} s, "
+          f"{result['completed']} completed, {result['wrong']} wrong")
+    if result["seconds"]:
+        print(f"{result['events'] / result['seconds']:,.0f} events/s")
+    print(f"latency p50 {_percentile(latencies, 0.5)} ns, p99 {_percentile(latencies, 0.99)} ns, "
+          f"max {latencies[-1]} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,91 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+import argparse
 import json
+import os
+from autosave import SaveWriter
+from binarydeck import MappedDeck, MappedPromptStore, is_binary_deck
+from history import AttemptHistory
+from journal import LearningJournal, load_progress
+import importer
 import keyboard
+import keymap
+import keytrace
+import queue
 import random
-from collections import defaultdict
+import sqlite3
+import time
+from engine import TrainerEngine, MAX_VISIBLE_PROMPTS, KEYS_CHANGED, STACK_CHANGED
+from configlist import VirtualList, ListItem
+from search import IndexBuild, scan
+from stackview import PromptStackView, CanvasPromptStack, ACTIVE_BACKGROUND, MAX_CANVAS_ROWS
+
+KEY_EVENT_QUEUE_SIZE = 512  # Maximum number of raw key events buffered between hook and UI
+KEY_EVENT_BATCH_SIZE = 64  # Maximum number of key events processed per consumer run
+KEY_EVENT_POLL_MS = 5  # Delay between consumer runs when the queue is empty
+HOOK_DEBOUNCE_MS = 150  # Focus must settle this long before hooks are installed or removed
+FRAME_MS = 16  # Minimum time between two repaints, about one display refresh
+AUTOSAVE_DELAY_MS = 2000  # Edits must pause this long before the configuration is saved
+SAVE_POLL_MS = 100  # How often a running save is checked for errors
+INDEX_POLL_MS = 50  # How often a search index built in the background is checked
+CONFIG_FILETYPES = [("JSON files", "*.json"), ("Binary decks", "*.hkdeck")]
 
 class HotkeyTrainer:
-    def __init__(self):
+    def __init__(self, trace_path=None, canvas_stack=False):
         self.root = tk.Tk()
         self.root.title("Hotkey Trainer")
         
         # State variables
-        self.prompts = []  # List of prompt dictionaries
-        self.visible_prompts = 3  # Default number of visible prompts
+        seed = random.randrange(2**63)  # Stored in traces so replays pick the same prompts
+        self.engine = TrainerEngine(rng=random.Random(seed))  # Prompts, matching and adaptive weights
+        self.trace_recorder = keytrace.TraceRecorder(trace_path, seed) if trace_path else None
         self.show_hotkeys = True
-        self.weights = defaultdict(lambda: 1.0)  # Weights for each prompt
-        self.sequence_groups = []  # List of prompt sequences
-        self.current_sequence = None
-        self.consecutive_correct = defaultdict(int)  # Track consecutive correct answers
+        self.canvas_stack = canvas_stack  # Draw the prompt stack on one canvas instead of widget rows
+        self.selective_hooks = False  # Only hook the keys used by the loaded deck
         self.current_config_file = None  # Track the currently loaded config file
-        self.last_pressed_hotkey = ""  # Track the last pressed hotkey
-        self.current_keys = set()  # Track currently pressed keys
-        self.displayed_prompts = []  # Track currently displayed prompts
-        self.wrong_attempt = False  # Track if last attempt was wrong
-        self.waiting_for_combination = False  # Track if we're waiting for a complete combination
-        self.target_hotkey_parts = set()  # Track parts of the target hotkey
-        
-        # Key mapping for normalization
-        self.modifier_map = {
-            # Ctrl variants
-            'left ctrl': 'ctrl', 'right ctrl': 'ctrl', 'control_l': 'ctrl', 'control_r': 'ctrl', 'control': 'ctrl',
-            'strg': 'ctrl',  # German
-            # Alt variants
-            'left alt': 'alt', 'right alt': 'alt', 'alt_l': 'alt', 'alt_r': 'alt', 'alt': 'alt',
-            'alt gr': 'alt', 'altgr': 'alt', 'alt_graph': 'alt',  # AltGr variants
-            # Shift variants
-            'left shift': 'shift', 'right shift': 'shift', 'shift_l': 'shift', 'shift_r': 'shift', 'shift': 'shift',
-            'umschalt': 'shift',  # German
-            # Windows/Super/Meta variants
-            'left windows': 'win', 'right windows': 'win', 'windows': 'win', 'win_l': 'win', 'win_r': 'win',
-            'super_l': 'win', 'super_r': 'win', 'super': 'win',
-            'meta_l': 'win', 'meta_r': 'win', 'meta': 'win',
-        }
-        
-        # Common key name normalizations
-        self.key_map = {
-            # Special characters
-            'minus': '-', 'plus': '+', 'comma': ',', 'period': '.', 'dot': '.',
-            'slash': '/', 'backslash': '\\', 'semicolon': ';', 'colon': ':',
-            'bracketleft': '[', 'bracketright': ']', 'braceleft': '{', 'braceright': '}',
-            'parenleft': '(', 'parenright': ')', 'equal': '=', 'quotedbl': '"',
-            'apostrophe': "'", 'grave': '`', 'asciitilde': '~', 'numbersign': '#',
-            'dollar': '$', 'percent': '%', 'ampersand': '&', 'asterisk': '*',
-            'question': '?', 'exclaim': '!', 'at': '@', 'asciicircum': '^',
-            'underscore': '_', 'space': 'space',
-            # Function keys
-            'f1': 'f1', 'f2': 'f2', 'f3': 'f3', 'f4': 'f4', 'f5': 'f5',
-            'f6': 'f6', 'f7': 'f7', 'f8': 'f8', 'f9': 'f9', 'f10': 'f10',
-            'f11': 'f11', 'f12': 'f12',
-            # Navigation keys
-            'return': 'enter', 'enter': 'enter',
-            'escape': 'esc', 'esc': 'esc',
-            'tab': 'tab',
-            'backspace': 'backspace',
-            'delete': 'del', 'del': 'del',
-            'insert': 'ins', 'ins': 'ins',
-            'home': 'home', 'end': 'end',
-            'pageup': 'pgup', 'pgup': 'pgup', 'prior': 'pgup',
-            'pagedown': 'pgdn', 'pgdn': 'pgdn', 'next': 'pgdn',
-            'up': 'up', 'down': 'down', 'left': 'left', 'right': 'right',
-            # German specific
-            'adiaeresis': 'ä', 'odiaeresis': 'ö', 'udiaeresis': 'ü',
-            'ssharp': 'ß',
-            # Number pad
-            'kp_0': '0', 'kp_1': '1', 'kp_2': '2', 'kp_3': '3', 'kp_4': '4',
-            'kp_5': '5', 'kp_6': '6', 'kp_7': '7', 'kp_8': '8', 'kp_9': '9',
-            'kp_decimal': '.', 'kp_divide': '/', 'kp_multiply': '*',
-            'kp_subtract': '-', 'kp_add': '+', 'kp_enter': 'enter',
-        }
+        self.mapped_deck_file = None  # Binary deck the engine reads from, it can't be replaced while mapped
+        self.prompt_index = None  # Search index for Settings, built in the background
+        self.index_build = None  # IndexBuild on its way to become prompt_index
+        self.settings_window = None  # Built when Settings is first opened, hidden when closed
+        self.config_dirty = False  # Configuration changed since it was loaded or saved
+        self.autosave_job = None  # Pending debounced autosave
+        self.save_poll_job = None  # Pending check of a running save
+        self.save_writer = SaveWriter()  # Writes configurations on a background thread
+        self.journal = None  # LearningJournal next to the current config file
+        self.history = None  # AttemptHistory next to the current config file
+        self.key_events = queue.Queue(maxsize=KEY_EVENT_QUEUE_SIZE)  # Raw key events from the hook thread
+        self.key_events_dropped = False  # Set by the hook thread when the queue overflows
+        self.main_window_focused = False  # Updated from focus events of the main window
+        self.open_dialogs = 0  # Number of open Toplevel windows
+        self.input_active = False  # Main window focused and no dialog open, read by the hook thread
+        self.hooks_installed = False  # Whether the trainer's global keyboard hooks are in place
+        self.hook_update_job = None  # Pending debounced hook install/removal
+        self.hook_stats = {"installs": 0, "removals": 0, "install_ns": 0, "removal_ns": 0}
+        self.dirty = 0  # KEYS_CHANGED / STACK_CHANGED flags waiting for the next repaint
+        self.render_job = None  # Pending repaint
+        self.last_render_ns = 0  # perf_counter_ns of the last repaint
+        
+        # Resolve raw key events through one precomputed table
+        keymap.build_key_table(keyboard.key_to_scan_codes)
         
         self._setup_ui()
-        self._load_keyboard_listener()
+        self.root.protocol("WM_DELETE_WINDOW", self._close)
+        self._schedule_hook_update()
+        self.root.after(KEY_EVENT_POLL_MS, self._process_key_events)
     
     def _setup_ui(self):
         # Main frame
         self.root.resizable(False, False)  # Prevent window resizing
+        
+        # Keep the input gate up to date instead of querying Tk per keystroke
+        self.root.bind('<FocusIn>', lambda e: self._set_main_window_focused(True), add='+')
+        self.root.bind('<FocusOut>', lambda e: self._set_main_window_focused(False), add='+')
         self.main_frame = ttk.Frame(self.root, padding="10")
         self.main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # Create a style for highlighted prompts
         style = ttk.Style()
-        style.configure("Active.TFrame", background="#e6f3ff")  # Light blue background
+        style.configure("Active.TFrame", background=ACTIVE_BACKGROUND)
         
         # Disable tab navigation for main window widgets
         self.root.bind_class('TFrame', '<Key-Tab>', lambda e: "break")
@@ -107,37 +102,12 @@ class HotkeyTrainer:
         self.prompts_frame = ttk.Frame(self.main_frame)
         self.prompts_frame.grid(row=1, column=0, pady=10)
         
-        # Pre-create all possible prompt widgets
-        self.prompt_widgets = []
-        for i in range(10):  # Maximum number of visible prompts
-            frame = ttk.Frame(self.prompts_frame)
-            
-            # Create a horizontal container for the prompt and indicator
-            content_frame = ttk.Frame(frame)
-            content_frame.pack(fill=tk.X, expand=True)
-            
-            # Add the prompt text label with fixed width
-            label = ttk.Label(content_frame, width=50, anchor="w")
-            label.pack(side=tk.LEFT)
-            
-            # Disable focus and tab navigation for prompt widgets
-            label.configure(takefocus=0)
-            
-            # Add indicator
-            canvas = tk.Canvas(content_frame, width=10, height=10, highlightthickness=0)
-            canvas.pack(side=tk.LEFT, padx=5)
-            canvas.pack_forget()  # Initially hidden
-            canvas.configure(takefocus=0)  # Disable focus for canvas
-            
-            self.prompt_widgets.append({
-                'frame': frame,
-                'label': label,
-                'indicator': canvas
-            })
-            
-            # Disable focus for frames
-            frame.configure(takefocus=0)
-            content_frame.configure(takefocus=0)
+        # Pre-create all possible prompt widgets, or one canvas for all of them
+        if self.canvas_stack:
+            self.prompt_stack = CanvasPromptStack(self.prompts_frame, MAX_CANVAS_ROWS)
+        else:
+            self.prompt_stack = PromptStackView(self.prompts_frame, MAX_VISIBLE_PROMPTS)
+        self.prompt_stack.frame.pack()
         
         # Controls
         controls_frame = ttk.Frame(self.main_frame)
@@ -155,11 +125,35 @@ class HotkeyTrainer:
         show_hotkeys_cb.configure(takefocus=0)  # Disable focus for checkbox
     
     def _open_settings(self):
-        settings_window = tk.Toplevel(self.root)
+        """Show the Settings window, building it the first time."""
+        if self.settings_window is None:
+            self._build_settings()
+        else:
+            self.settings_window.deiconify()
+        self._dialog_opened()
+        self.settings_window.grab_set()  # Make dialog modal
+        
+        # Bring the parts that may have changed while it was hidden up to date
+        self.visible_var.set(str(self.engine.visible_prompts))
+        self.spaced_repetition_var.set(bool(self.engine.scheduler))
+        self.selective_hooks_var.set(self.selective_hooks)
+        self.render_stats_label.configure(text=self.prompt_stack.stats.report())
+        self.hook_report_label.configure(text=self._hook_report())
+        self._update_config_display()
+        self._search_index()  # Start building it before the first search
+    
+    def _close_settings(self):
+        """Hide the Settings window, the prompt stack is left as it is."""
+        self.settings_window.grab_release()
+        self.settings_window.withdraw()
+        self._dialog_closed()
+        self._schedule_render(STACK_CHANGED)
+    
+    def _build_settings(self):
+        settings_window = self.settings_window = tk.Toplevel(self.root)
         settings_window.title("Settings")
         settings_window.geometry("600x800")
         settings_window.transient(self.root)  # Make dialog modal
-        settings_window.grab_set()  # Make dialog modal
         
         # Prompt configuration
         prompt_frame = ttk.LabelFrame(settings_window, text="Prompts", padding="10")
@@ -167,7 +161,9 @@ class HotkeyTrainer:
         
         # Add prompt button
         ttk.Button(prompt_frame, text="Add Prompt", 
-                  command=lambda: self._add_prompt_dialog(settings_window)).pack()
+                  command=lambda: self._add_prompt_dialog(settings_window)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(prompt_frame, text="Import...", 
+                  command=self._import_prompts).pack(side=tk.LEFT, padx=5)
         
         # Sequence groups
         sequence_frame = ttk.LabelFrame(settings_window, text="Sequence Groups", padding="10")
@@ -177,15 +173,8 @@ class HotkeyTrainer:
         self.sequence_entry = ttk.Entry(sequence_frame, width=50)
         self.sequence_entry.pack(pady=5)
         
-        # Add focus handlers for the sequence entry
-        def on_sequence_entry_focus(event):
-            keyboard.unhook_all()
-        
-        def on_sequence_entry_focusout(event):
-            self._load_keyboard_listener()
-        
-        self.sequence_entry.bind('<FocusIn>', on_sequence_entry_focus)
-        self.sequence_entry.bind('<FocusOut>', on_sequence_entry_focusout)
+        # No hook handling needed for the entry: the global hooks are
+        # removed while the Settings window is open
         
         ttk.Button(sequence_frame, text="Add Sequence", command=self._add_sequence).pack()
         
@@ -194,28 +183,53 @@ class HotkeyTrainer:
         visible_frame.pack(fill=tk.X, padx=10, pady=5)
         
         ttk.Label(visible_frame, text="Number of Visible Prompts:").pack(side=tk.LEFT)
-        visible_var = tk.StringVar(value=str(self.visible_prompts))
-        visible_spinbox = ttk.Spinbox(visible_frame, from_=1, to=10, width=5,
-                                    textvariable=visible_var,
-                                    command=lambda: self._update_visible_prompts(visible_var.get()))
+        self.visible_var = tk.StringVar(value=str(self.engine.visible_prompts))
+        visible_spinbox = ttk.Spinbox(visible_frame, from_=1, to=self.prompt_stack.max_rows, width=5,
+                                    textvariable=self.visible_var,
+                                    command=lambda: self._update_visible_prompts(self.visible_var.get()))
         visible_spinbox.pack(side=tk.LEFT, padx=5)
+        self.render_stats_label = ttk.Label(visible_frame)
+        self.render_stats_label.pack(side=tk.LEFT, padx=10)
+        
+        # Practice mode setting
+        mode_frame = ttk.LabelFrame(settings_window, text="Practice Mode", padding="10")
+        mode_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.spaced_repetition_var = tk.BooleanVar(value=bool(self.engine.scheduler))
+        ttk.Radiobutton(mode_frame, text="Weighted random", value=False,
+                        variable=self.spaced_repetition_var,
+                        command=self._update_practice_mode).pack(side=tk.LEFT)
+        ttk.Radiobutton(mode_frame, text="Spaced repetition", value=True,
+                        variable=self.spaced_repetition_var,
+                        command=self._update_practice_mode).pack(side=tk.LEFT, padx=5)
+        
+        # Keyboard hook setting
+        hook_frame = ttk.LabelFrame(settings_window, text="Keyboard Hooks", padding="10")
+        hook_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.selective_hooks_var = tk.BooleanVar(value=self.selective_hooks)
+        ttk.Checkbutton(hook_frame, text="Only listen to keys used by the prompts (other keys don't count as wrong)",
+                        variable=self.selective_hooks_var,
+                        command=self._toggle_selective_hooks).pack(anchor="w")
+        self.hook_report_label = ttk.Label(hook_frame)
+        self.hook_report_label.pack(anchor="w")
         
         # Config display
         config_frame = ttk.LabelFrame(settings_window, text="Current Configuration", padding="10")
         config_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        # Create a canvas with scrollbar for the config list
-        canvas = tk.Canvas(config_frame)
-        scrollbar = ttk.Scrollbar(config_frame, orient="vertical", command=canvas.yview)
-        self.config_list_frame = ttk.Frame(canvas)
-        
-        canvas.configure(yscrollcommand=scrollbar.set)
+        # Search as you type; the global hooks are removed while Settings is
+        # open, so typing here is never taken as an answer
+        search_frame = ttk.Frame(config_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.search_var, width=40).pack(side=tk.LEFT, padx=5)
+        self.search_var.trace_add("write", lambda *args: self._update_config_display())
         
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        canvas.create_window((0, 0), window=self.config_list_frame, anchor="nw")
-        
-        self._update_config_display()
+        # Only the visible rows have widgets, scrolling rebinds them
+        self.config_list = VirtualList(config_frame)
+        self.config_list.frame.pack(fill=tk.BOTH, expand=True)
         
         # File operations
         file_frame = ttk.Frame(settings_window, padding="10")
@@ -228,92 +242,129 @@ class HotkeyTrainer:
         ttk.Button(file_frame, text="Load Configuration", 
                   command=self._load_config).pack(side=tk.LEFT, padx=5)
         
-        def on_settings_close():
-            settings_window.destroy()
-            # Force update of main window display
-            self.displayed_prompts = []  # Reset displayed prompts
-            self._update_display()
-        
-        settings_window.protocol("WM_DELETE_WINDOW", on_settings_close)
+        settings_window.protocol("WM_DELETE_WINDOW", self._close_settings)
     
     def _update_config_display(self):
-        # Clear existing items
-        for widget in self.config_list_frame.winfo_children():
-            widget.destroy()
-        
-        # Display prompts
-        ttk.Label(self.config_list_frame, text="Prompts:", font=("", 10, "bold")).pack(anchor="w")
-        for prompt in self.prompts:
-            frame = ttk.Frame(self.config_list_frame)
-            frame.pack(fill=tk.X, pady=2)
-            ttk.Label(frame, text=f"{prompt['name']} - {prompt['hotkey']} (weight: {prompt['weight']})").pack(side=tk.LEFT)
-            ttk.Button(frame, text="×", width=3,
-                      command=lambda p=prompt: self._delete_prompt(p)).pack(side=tk.RIGHT)
-        
-        # Display sequence groups
-        if self.sequence_groups:
-            ttk.Label(self.config_list_frame, text="\nSequence Groups:", font=("", 10, "bold")).pack(anchor="w")
-            for i, group in enumerate(self.sequence_groups):
-                frame = ttk.Frame(self.config_list_frame)
-                frame.pack(fill=tk.X, pady=2)
-                
-                # Create weight entry
-                weight_var = tk.StringVar(value=str(group.get("weight", 1.0)))
-                weight_entry = ttk.Entry(frame, textvariable=weight_var, width=8)
-                
-                # Update weight when changed
-                def update_weight(idx=i, var=weight_var):
-                    try:
-                        self.sequence_groups[idx]["weight"] = float(var.get())
-                    except ValueError:
-                        var.set("1.0")
-                        self.sequence_groups[idx]["weight"] = 1.0
-                
-                weight_var.trace_add("write", lambda *args, idx=i, var=weight_var: update_weight(idx, var))
-                
-                ttk.Label(frame, text=f"Group {i+1}: {group['name']} - {','.join(group['prompts'])}").pack(side=tk.LEFT)
-                ttk.Label(frame, text="Weight:").pack(side=tk.RIGHT, padx=(5, 0))
-                weight_entry.pack(side=tk.RIGHT, padx=(0, 5))
-                ttk.Button(frame, text="×", width=3,
-                          command=lambda idx=i: self._delete_sequence(idx)).pack(side=tk.RIGHT)
-    
-    def _delete_prompt(self, prompt):
-        self.prompts.remove(prompt)
+        store = self.engine.prompts
+        query = self.search_var.get().strip()
+        if query:
+            index = self._search_index()
+            prompt_ids = index.search(query) if index else scan(store, query)
+            groups = [(i, group) for i, group in enumerate(self.engine.sequence_groups)
+                      if query.lower() in group['name'].lower()]
+            prompts_header = f"Prompts ({len(prompt_ids)} of {len(store)}):"
+        else:
+            prompt_ids = store.id_list()
+            groups = list(enumerate(self.engine.sequence_groups))
+            prompts_header = "Prompts:"
+        
+        # Rows are built when they are scrolled into view: the prompts header,
+        # the prompts, then the sequence groups header and the groups
+        def item_at(index):
+            if index == 0:
+                return ListItem(prompts_header, header=True)
+            if index <= len(prompt_ids):
+                prompt = store.get(prompt_ids[index - 1])
+                return ListItem(f"{prompt['name']} - {prompt['hotkey']} (weight: {prompt['weight']})",
+                                key=prompt["id"], on_delete=self._delete_prompt)
+            if index == len(prompt_ids) + 1:
+                return ListItem("Sequence Groups:", header=True)
+            i, group = groups[index - len(prompt_ids) - 2]
+            return ListItem(f"Group {i+1}: {group['name']} - {','.join(group['prompts'])}",
+                            key=i, on_delete=self._delete_sequence,
+                            weight=group.get("weight", 1.0),
+                            on_weight=self._set_sequence_weight)
+        
+        count = 1 + len(prompt_ids) + (1 + len(groups) if groups else 0)
+        self.config_list.set_source(count, item_at)
+    
+    def _search_index(self):
+        """The search index over the deck, or None while it is built in the background."""
+        if self.prompt_index is None and self.index_build is None:
+            build = self.index_build = IndexBuild(self.engine.prompts.snapshot())
+            self.root.after(INDEX_POLL_MS, lambda: self._poll_index_build(build))
+        return self.prompt_index
+    
+    def _poll_index_build(self, build):
+        if build is not self.index_build:
+            return  # The deck was replaced, a newer build took over
+        if not build.done():
+            self.root.after(INDEX_POLL_MS, lambda: self._poll_index_build(build))
+            return
+        self.prompt_index = build.result()
+        self.index_build = None
+        if self.settings_window is not None and self.search_var.get().strip():
+            self._update_config_display()  # Same results, now from the index
+    
+    def _reset_search_index(self):
+        """Drop the search index after the deck changed in bulk, it is built again when needed."""
+        self.prompt_index = None
+        self.index_build = None
+    
+    def _index_prompt_added(self, prompt):
+        if self.prompt_index is not None:
+            self.prompt_index.add(prompt)
+        elif self.index_build is not None:
+            self.index_build.add(prompt)
+    
+    def _index_prompt_removed(self, prompt_id):
+        if self.prompt_index is not None:
+            self.prompt_index.remove(prompt_id)
+        elif self.index_build is not None:
+            self.index_build.remove(prompt_id)
+    
+    def _delete_prompt(self, prompt_id):
+        self.engine.remove_prompt(self.engine.prompts.get(prompt_id))
+        self._index_prompt_removed(prompt_id)
+        self._mark_dirty()
         self._update_config_display()
-        self._update_display()
+        self._schedule_render(STACK_CHANGED)
     
     def _delete_sequence(self, index):
-        del self.sequence_groups[index]
+        self.engine.remove_sequence_group(index)
+        self._mark_dirty()
         self._update_config_display()
     
+    def _set_sequence_weight(self, index, weight):
+        self.engine.set_sequence_weight(index, weight)
+        self._mark_dirty()
+    
     def _add_sequence(self):
         sequence_text = self.sequence_entry.get()
         try:
             # Parse the sequence text
             groups = sequence_text.split(';')
+            dangling_names = {}
             for group in groups:
                 if not group.strip():
                     continue
                 name, prompts = group.split(':')
                 prompt_list = [p.strip() for p in prompts.split(',')]
-                self.sequence_groups.append({
+                missing = self.engine.add_sequence_group({
                     "name": name.strip(),
                     "prompts": prompt_list,
                     "weight": 1.0  # Default weight
                 })
+                if missing:
+                    dangling_names[name.strip()] = missing
             self.sequence_entry.delete(0, tk.END)
+            self._mark_dirty()
             self._update_config_display()
         except:
             messagebox.showerror("Error", "Invalid sequence format. Please use the format: group1: prompt1,prompt2;group2: prompt3,prompt4")
+            return
+        if dangling_names:
+            self._warn_dangling_names(dangling_names)
     
     def _add_prompt_dialog(self, parent):
         dialog = tk.Toplevel(parent)
+        self._register_dialog(dialog)
         dialog.title("Add Prompt")
         dialog.transient(parent)  # Make dialog modal
         dialog.grab_set()  # Make dialog modal
         
-        # Temporarily disable global keyboard hook
-        keyboard.unhook_all()
+        # Make sure the global keyboard hook is out of the way right now
+        self._remove_hooks()
         
         ttk.Label(dialog, text="Prompt Name:").pack(pady=5)
         name_entry = ttk.Entry(dialog)
@@ -339,6 +390,7 @@ class HotkeyTrainer:
         dialog_keys = set()
         current_hotkey = [""]  # Use a list to store the current hotkey
         is_capturing_hotkey = [False]  # Use a list to store the state
+        capture_hook = [None]  # Handle of the capturing keyboard hook
         
         def start_hotkey_capture():
             is_capturing_hotkey[0] = True
@@ -351,7 +403,7 @@ class HotkeyTrainer:
             hotkey_area.configure(relief="sunken")
             
             # Set up keyboard hook for capturing
-            keyboard.hook(on_dialog_key_event, suppress=True)
+            capture_hook[0] = keyboard.hook(on_dialog_key_event, suppress=True)
         
         def stop_hotkey_capture():
             is_capturing_hotkey[0] = False
@@ -359,7 +411,9 @@ class HotkeyTrainer:
             hotkey_area.configure(relief="solid")
             
             # Remove keyboard hook
-            keyboard.unhook_all()
+            if capture_hook[0]:
+                keyboard.unhook(capture_hook[0])
+                capture_hook[0] = None
         
         def on_dialog_key_event(event):
             if not is_capturing_hotkey[0]:
@@ -419,23 +473,23 @@ class HotkeyTrainer:
                 return
             try:
                 weight = float(weight_entry.get())
-                self.prompts.append({
+                prompt = {
                     "name": name_entry.get(),
                     "hotkey": current_hotkey[0],
                     "weight": weight
-                })
+                }
+                self.engine.add_prompt(prompt)
+                self._mark_dirty()
+                self._index_prompt_added(prompt)
+                stop_hotkey_capture()
                 dialog.destroy()
-                # Restore global keyboard hook
-                self._load_keyboard_listener()
                 self._update_config_display()
             except ValueError:
-                messagebox.showerror("Error", "Weight must be a number")
+                messagebox.showerror("Error", "Weight must be a positive number")
         
         def on_dialog_close():
             stop_hotkey_capture()  # Make sure to stop capturing
             dialog.destroy()
-            # Restore global keyboard hook
-            self._load_keyboard_listener()
         
         dialog.protocol("WM_DELETE_WINDOW", on_dialog_close)
         ttk.Button(dialog, text="Save", command=save_prompt).pack(pady=10)
@@ -445,328 +499,455 @@ class HotkeyTrainer:
     
     def _save_config_as(self):
         # Temporarily disable keyboard hook
-        keyboard.unhook_all()
-        filename = filedialog.asksaveasfilename(defaultextension=".json")
-        # Restore keyboard hook
-        self._load_keyboard_listener()
+        self._remove_hooks()
+        filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=CONFIG_FILETYPES)
+        # Restore keyboard hook if the main window is still active
+        self._schedule_hook_update()
+        if filename and self._is_mapped_deck(filename):
+            messagebox.showerror("Save Failed",
+                                 f"{filename} is open as the current deck, please choose another file.")
+            return
         if filename:
             self.current_config_file = filename
             self._save_config()
+            self._open_journal(restore=False)  # Progress so far moves along with the deck
+            self._open_history()
     
     def _save_config(self):
-        if not self.current_config_file:
+        if not self._can_save():
             self._save_config_as()
             return
-            
-        config = {
-            "prompts": self.prompts,
-            "visible_prompts": self.visible_prompts,
-            "sequence_groups": self.sequence_groups
+        self._write_config()
+    
+    def _is_mapped_deck(self, filename):
+        if self.mapped_deck_file is None:
+            return False
+        return os.path.normcase(os.path.abspath(filename)) == os.path.normcase(os.path.abspath(self.mapped_deck_file))
+    
+    def _can_save(self):
+        """Whether the configuration can be written to the current config file."""
+        return self.current_config_file is not None and not self._is_mapped_deck(self.current_config_file)
+    
+    def _config_snapshot(self):
+        """Copy what is saved, cheap enough for the UI thread; serializing happens on the writer thread."""
+        return {
+            "prompts": self.engine.prompts.snapshot(),
+            "visible_prompts": self.engine.visible_prompts,
+            "sequence_groups": [dict(group) for group in self.engine.sequence_groups],
+            "selective_hooks": self.selective_hooks,
+            "spaced_repetition": bool(self.engine.scheduler)
         }
-        with open(self.current_config_file, 'w') as f:
-            json.dump(config, f)
+    
+    def _write_config(self):
+        """Hand the current configuration to the writer thread."""
+        if self.autosave_job is not None:
+            self.root.after_cancel(self.autosave_job)
+            self.autosave_job = None
+        self.config_dirty = False
+        self.save_writer.submit(self.current_config_file, self._config_snapshot())
+        if self.save_poll_job is None:
+            self.save_poll_job = self.root.after(SAVE_POLL_MS, self._poll_save)
+    
+    def _poll_save(self):
+        """Report a failed save once the writer thread is done."""
+        self.save_poll_job = None
+        if not self.save_writer.idle():
+            self.save_poll_job = self.root.after(SAVE_POLL_MS, self._poll_save)
+            return
+        error = self.save_writer.take_error()
+        if error:
+            self.config_dirty = True  # Try again with the next edit
+            messagebox.showerror("Save Failed", f"Could not save {self.current_config_file}:\n{error}")
+    
+    def _mark_dirty(self):
+        """Note a configuration change and autosave once edits pause."""
+        self.config_dirty = True
+        if not self._can_save():
+            return  # Nowhere to save to until Save As was used
+        if self.autosave_job is not None:
+            self.root.after_cancel(self.autosave_job)
+        self.autosave_job = self.root.after(AUTOSAVE_DELAY_MS, self._autosave)
+    
+    def _close(self):
+        """Close the trainer, offering Save As first if edits to a binary deck would be lost."""
+        if self.config_dirty and self.current_config_file is not None and not self._can_save():
+            answer = messagebox.askyesnocancel(
+                "Unsaved Changes",
+                f"{self.current_config_file} is not saved automatically while it is open.\n"
+                "Save your changes to another file before closing?")
+            if answer is None:
+                return
+            if answer:
+                self._save_config_as()
+                if not self._can_save():
+                    return  # Save As was cancelled or failed, keep the edits around
+        self.root.destroy()
+    
+    def _autosave(self):
+        self.autosave_job = None
+        if self.config_dirty:
+            self._write_config()
     
     def _load_config(self):
         # Temporarily disable keyboard hook
-        keyboard.unhook_all()
-        filename = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
-        # Restore keyboard hook
-        self._load_keyboard_listener()
+        self._remove_hooks()
+        filename = filedialog.askopenfilename(filetypes=CONFIG_FILETYPES)
+        # Restore keyboard hook if the main window is still active
+        self._schedule_hook_update()
         if filename:
-            with open(filename, 'r') as f:
-                config = json.load(f)
-                self.prompts = config["prompts"]
-                self.visible_prompts = config["visible_prompts"]
-                self.sequence_groups = config.get("sequence_groups", [])
-                self.current_config_file = filename
-                self._update_display()
-                self._update_config_display()
+            if is_binary_deck(filename):
+                # Prompts stay in the file and are read when they are needed
+                prompts = MappedPromptStore(MappedDeck(filename))
+                config = prompts.deck.settings
+            else:
+                with open(filename, 'r') as f:
+                    config = json.load(f)
+                prompts = config["prompts"]
+            dangling_names = self.engine.load_deck(prompts, config["visible_prompts"],
+                                                   config.get("sequence_groups", []))
+            self.mapped_deck_file = filename if is_binary_deck(filename) else None
+            self.selective_hooks = config.get("selective_hooks", False)
+            self.engine.set_spaced_repetition(config.get("spaced_repetition", False))
+            self.current_config_file = filename
+            self._open_journal(restore=True)
+            if self.trace_recorder:
+                # The journal keeps changing while recording, replays start from this
+                self.trace_recorder.record_progress(time.perf_counter_ns(), self.engine.learning_state(),
+                                                    self.engine.schedule_state())
+            self._open_history()
+            self._reset_search_index()  # Rebuilt for the new deck
+            self.config_dirty = False
+            if self.autosave_job is not None:
+                self.root.after_cancel(self.autosave_job)
+                self.autosave_job = None
+            self._schedule_render(STACK_CHANGED)
+            self._update_config_display()
+            if dangling_names:
+                self._warn_dangling_names(dangling_names)
+    
+    def _open_journal(self, restore):
+        """Journal learning progress next to the current config file.
+        
+        With restore, the progress saved for that file replaces the one in
+        memory first.
+        """
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+            self.engine.learning_listener = None
+            self.engine.schedule_listener = None
+        try:
+            if restore:
+                learning, schedule = load_progress(self.current_config_file)
+                self.engine.restore_learning(learning)
+                self.engine.restore_schedule(schedule)
+            self.journal = LearningJournal(self.current_config_file, self.engine.learning_state(),
+                                           self.engine.schedule_state())
+        except (OSError, ValueError) as e:
+            # Leave the files alone so nothing saved earlier is overwritten
+            messagebox.showwarning("Learning Progress",
+                                   f"Learning progress for {self.current_config_file} won't be saved:\n{e}")
+            return
+        self.engine.learning_listener = self.journal.record
+        self.engine.schedule_listener = self.journal.record_unit
+    
+    def _open_history(self):
+        """Record attempts in the history database next to the current config file, as a new session."""
+        if self.history:
+            self.history.close()
+            self.history = None
+            self.engine.attempt_listener = None
+        try:
+            self.history = AttemptHistory(self.current_config_file)
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showwarning("Attempt History",
+                                   f"Attempts for {self.current_config_file} won't be recorded:\n{e}")
+            return
+        self.engine.attempt_listener = self.history.record
+    
+    def _warn_dangling_names(self, dangling_names):
+        lines = [f"{group}: {', '.join(names)}" for group, names in dangling_names.items()]
+        messagebox.showwarning("Unknown Prompts",
+                               "These sequence groups reference prompts that don't exist and were shortened:\n\n"
+                               + "\n".join(lines))
+    
+    def _import_prompts(self):
+        """Add all shortcuts of a CSV/TSV cheat sheet or keymap JSON in one batch."""
+        self._remove_hooks()
+        filename = filedialog.askopenfilename(filetypes=[
+            ("Shortcut lists", "*.csv *.tsv *.txt *.json"), ("All files", "*.*")])
+        self._schedule_hook_update()
+        if not filename:
+            return
+        try:
+            prompts, counts = importer.import_file(filename, self.engine.prompts)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import Failed", str(e))
+            return
+        
+        self.engine.add_prompts(prompts)
+        self._mark_dirty()
+        self._reset_search_index()  # Rebuilt in one go instead of prompt by prompt
+        self._update_config_display()
+        messagebox.showinfo("Import", f"Added {len(prompts)} of {counts['read']} shortcuts.\n"
+                            f"{counts['duplicates']} duplicates and {counts['skipped']} entries "
+                            f"without a usable name or single chord were left out.")
+    
+    def _update_practice_mode(self):
+        self.engine.set_spaced_repetition(self.spaced_repetition_var.get())
+        self._mark_dirty()
+        self._schedule_render(STACK_CHANGED)
+    
+    def _toggle_selective_hooks(self):
+        self.selective_hooks = self.selective_hooks_var.get()
+        self._mark_dirty()
+        # Hooks are reinstalled with the new mode once the main window is active again
+        self._remove_hooks()
+        self._schedule_hook_update()
     
     def _toggle_hotkeys(self):
         self.show_hotkeys = self.show_hotkeys_var.get()
-        self._update_display()
+        self._schedule_render(STACK_CHANGED)
+    
+    def _schedule_render(self, changes):
+        """Mark parts of the window dirty and repaint them at most once per frame.
+        
+        The first change after a quiet period is drawn right away, later ones
+        wait for the rest of the frame so a burst of key events is painted once.
+        """
+        if not changes:
+            return
+        self.dirty |= changes
+        if self.render_job is None:
+            elapsed_ms = (time.perf_counter_ns() - self.last_render_ns) // 1_000_000
+            self.render_job = self.root.after(max(0, FRAME_MS - elapsed_ms), self._render)
+    
+    def _render(self):
+        dirty = self.dirty
+        self.dirty = 0
+        self.render_job = None
+        self.last_render_ns = time.perf_counter_ns()
+        if dirty & KEYS_CHANGED:
+            self.hotkey_display.configure(text=self.engine.last_pressed_hotkey)
+        if dirty & STACK_CHANGED:
+            self._update_display()
     
     def _update_display(self):
         # Get next prompts if we don't have enough displayed
-        if not self.displayed_prompts:
-            next_prompts = self._get_next_prompts()
-            if next_prompts:
-                self.displayed_prompts = next_prompts
-        
-        # Hide all widgets first
-        for widget in self.prompt_widgets:
-            widget['frame'].pack_forget()
-            widget['indicator'].pack_forget()
-            widget['frame'].configure(style="TFrame")  # Reset style
-            widget['label'].configure(background="")  # Reset background
-        
-        # Update and show only the needed widgets
-        for i, prompt in enumerate(self.displayed_prompts):
-            widget = self.prompt_widgets[i]
-            
-            # Update label text
+        self.engine.ensure_prompts()
+        displayed_prompts = self.engine.displayed_prompts
+        
+        # Describe the stack and let the view change only the rows that differ
+        active = len(displayed_prompts) - 1
+        rows = []
+        for i, prompt in enumerate(displayed_prompts):
             name = prompt["name"]
             hotkey = f" ({prompt['hotkey']})" if self.show_hotkeys else ""
-            widget['label'].configure(text=f"{name}{hotkey}")
-            
-            # Show frame
-            widget['frame'].pack(fill=tk.X, pady=2)
-            
-            # Highlight the last (active) prompt
-            if i == len(self.displayed_prompts) - 1:
-                widget['frame'].configure(style="Active.TFrame")
-                widget['label'].configure(background="#e6f3ff")  # Match frame background
-            
-            # Update indicator
-            if i == len(self.displayed_prompts) - 1 and self.wrong_attempt:
-                widget['indicator'].pack(side=tk.LEFT, padx=5)
-                widget['indicator'].delete("all")
-                widget['indicator'].create_oval(2, 2, 8, 8, fill='red', outline='red')
-        
-        # Force update
-        self.root.update_idletasks()
-    
-    def _get_next_prompts(self):
-        if not self.prompts and not self.sequence_groups:
-            return []
-        
-        # Handle current sequence if it exists
-        if self.current_sequence:
-            if len(self.current_sequence) >= self.visible_prompts:
-                return self.current_sequence[:self.visible_prompts]
-            else:
-                self.current_sequence = None
-        
-        # Combine individual prompts and sequence groups for selection
-        choices = []
-        weights = []
-        
-        # Add individual prompts
-        for prompt in self.prompts:
-            choices.append(("prompt", prompt))
-            weights.append(self.weights[prompt["name"]] * prompt["weight"])
-        
-        # Add sequence groups
-        for group in self.sequence_groups:
-            choices.append(("sequence", group))
-            weights.append(group.get("weight", 1.0))
-        
-        # Select based on weights
-        if not choices:
-            return []
-        
-        selected = random.choices(choices, weights=weights, k=1)[0]
-        
-        if selected[0] == "prompt":
-            # If a single prompt was selected, select the rest normally
-            result = [selected[1]]
-            remaining_count = self.visible_prompts - 1
-            if remaining_count > 0 and self.prompts:
-                remaining_weights = [self.weights[p["name"]] * p["weight"] for p in self.prompts]
-                result.extend(random.choices(self.prompts, weights=remaining_weights, k=remaining_count))
-            return result
-        else:
-            # If a sequence was selected, store it and return first part
-            self.current_sequence = selected[1]["prompts"]
-            return self.current_sequence[:self.visible_prompts]
+            rows.append((f"{name}{hotkey}", i == active, i == active and self.engine.wrong_attempt))
+        self.prompt_stack.render(rows, min(self.engine.visible_prompts, self.prompt_stack.max_rows))
+        
+        # Reaction times are measured from when the active prompt is on screen,
+        # which is after Tk ran the redraw it queued as idle work
+        self.root.after_idle(self._mark_shown)
+    
+    def _mark_shown(self):
+        timestamp = time.perf_counter_ns()
+        self.engine.mark_shown(timestamp)
+        if self.trace_recorder:
+            self.trace_recorder.record_shown(timestamp)
     
     def _normalize_key(self, key):
         """Normalize key names to handle modifiers and special keys consistently."""
-        key = str(key).lower()
-        
-        # Handle shift + key combinations for special characters
-        if key.startswith('shift+'):
-            base_key = key[6:]  # Remove 'shift+'
-            # Map shifted numbers and symbols
-            shift_map = {
-                '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
-                '6': '^', '7': '&', '8': '*', '9': '(', '0': ')',
-                '-': '_', '=': '+', '[': '{', ']': '}', '\\': '|',
-                ';': ':', "'": '"', ',': '<', '.': '>', '/': '?',
-                '`': '~'
-            }
-            if base_key in shift_map:
-                return shift_map[base_key]
-        
-        # Check modifier map first
-        if key in self.modifier_map:
-            return self.modifier_map[key]
-        
-        # Check key map next
-        if key in self.key_map:
-            return self.key_map[key]
-        
-        # Handle single characters
-        if len(key) == 1:
-            return key
-        
-        # If no special mapping exists, return the key as is
-        return key
+        return keymap.normalize_key(key)
 
     def _normalize_hotkey(self, keys):
         """Normalize a set of keys into a consistent hotkey string."""
-        # Split modifiers and regular keys
-        modifiers = sorted(k for k in keys if k in {'ctrl', 'alt', 'shift', 'win'})
-        other_keys = sorted(k for k in keys if k not in {'ctrl', 'alt', 'shift', 'win'})
-        
-        # Combine modifiers first, then other keys
-        normalized = modifiers + other_keys
-        return '+'.join(normalized)
-
+        return keymap.format_hotkey(keys)
+    
     def _update_visible_prompts(self, value):
         try:
             new_value = int(value)
-            if 1 <= new_value <= 10:
-                old_value = self.visible_prompts
-                self.visible_prompts = new_value
+            if 1 <= new_value <= self.prompt_stack.max_rows:
                 # Only reset display if the value actually changed
-                if old_value != new_value:
-                    self.displayed_prompts = []  # Reset displayed prompts
-                    self._update_display()
+                if self.engine.set_visible_prompts(new_value):
+                    self._mark_dirty()
+                    self._schedule_render(STACK_CHANGED)
         except ValueError:
             pass
 
     def _load_keyboard_listener(self):
-        def on_key_down(event):
-            # Only process if main window is focused and not in a dialog
-            if not self.root.focus_displayof() or any(w.winfo_exists() for w in self.root.winfo_children() if isinstance(w, tk.Toplevel)):
-                return True  # Don't suppress if not focused
-            
-            # Normalize the key name
-            key_name = self._normalize_key(event.name)
-            if key_name in self.current_keys:  # Skip if key is already pressed
-                return True
-                
-            self.current_keys.add(key_name)
-            
-            # Update display with normalized hotkey
-            hotkey_name = self._normalize_hotkey(self.current_keys)
-            self.last_pressed_hotkey = hotkey_name
-            # Update only the text of the label
-            self.root.after_idle(lambda: self.hotkey_display.configure(text=hotkey_name))
-            
-            if not self.displayed_prompts:  # Skip if no prompts are displayed
-                return True  # Don't suppress if no prompts
-            
-            # Get the bottom-most prompt
-            current_prompt = self.displayed_prompts[-1]
-            target_hotkey = current_prompt["hotkey"]
-            
-            # Split the target hotkey into parts
-            target_parts = set(target_hotkey.split('+'))
-            
-            # Get current non-modifier keys
-            non_modifier_keys = {k for k in self.current_keys if k not in {'ctrl', 'alt', 'shift', 'win'}}
-            
-            # Handle single non-modifier key hotkeys
-            if len(target_parts) == 1 and not any(part in {'ctrl', 'alt', 'shift', 'win'} for part in target_parts):
-                target_key = next(iter(target_parts))
-                
-                if len(non_modifier_keys) == 1 and key_name == target_key:
-                    # Correct single key press
-                    self.consecutive_correct[current_prompt["name"]] += 1
-                    if self.consecutive_correct[current_prompt["name"]] > 2:
-                        self.weights[current_prompt["name"]] *= 0.8
-                    
-                    self.wrong_attempt = False
-                    self.displayed_prompts.pop()
-                    
-                    # Add a new prompt at the top if we have room
-                    if len(self.displayed_prompts) < self.visible_prompts:
-                        next_prompts = self._get_next_prompts()
-                        if next_prompts:
-                            self.displayed_prompts.insert(0, next_prompts[0])
-                    
-                    self._update_display()
-                elif key_name not in target_parts and not key_name in {'ctrl', 'alt', 'shift', 'win'}:
-                    # Wrong key pressed (ignore modifier keys)
-                    self.weights[current_prompt["name"]] *= 1.2
-                    self.consecutive_correct[current_prompt["name"]] = 0
-                    self.wrong_attempt = True
-                    self._update_display()
-                return True  # Don't suppress if key was processed
-            
-            # Handle combination hotkeys
-            if not self.waiting_for_combination:
-                if key_name in target_parts:
-                    self.waiting_for_combination = True
-                    self.target_hotkey_parts = target_parts
-                    self.wrong_attempt = False
-                    self._update_display()
-                elif key_name not in target_parts and not key_name in {'ctrl', 'alt', 'shift', 'win'}:
-                    # Wrong key pressed while not in combination mode (ignore modifier keys)
-                    self.weights[current_prompt["name"]] *= 1.2
-                    self.consecutive_correct[current_prompt["name"]] = 0
-                    self.wrong_attempt = True
-                    self._update_display()
-                return True  # Don't suppress if key was processed
-            
-            # If we are waiting for a combination, check if the pressed key makes it wrong
-            if self.waiting_for_combination:
-                current_parts = set(hotkey_name.split('+'))
-                
-                # Check if we've pressed a key that's not in the target combination
-                if not current_parts.issubset(self.target_hotkey_parts):
-                    self.waiting_for_combination = False
-                    self.target_hotkey_parts.clear()
-                    if not key_name in {'ctrl', 'alt', 'shift', 'win'}:  # Only mark wrong for non-modifier keys
-                        self.weights[current_prompt["name"]] *= 1.2
-                        self.consecutive_correct[current_prompt["name"]] = 0
-                        self.wrong_attempt = True
-                        self._update_display()
-                # Check if we've completed the correct combination
-                elif current_parts == self.target_hotkey_parts:
-                    self.waiting_for_combination = False
-                    self.target_hotkey_parts.clear()
-                    self.consecutive_correct[current_prompt["name"]] += 1
-                    if self.consecutive_correct[current_prompt["name"]] > 2:
-                        self.weights[current_prompt["name"]] *= 0.8
-                    
-                    self.wrong_attempt = False
-                    self.displayed_prompts.pop()
-                    
-                    # Add a new prompt at the top if we have room
-                    if len(self.displayed_prompts) < self.visible_prompts:
-                        next_prompts = self._get_next_prompts()
-                        if next_prompts:
-                            self.displayed_prompts.insert(0, next_prompts[0])
-                    
-                    self._update_display()
-                    
-                    # If there are still keys held down that match the next prompt's hotkey,
-                    # start waiting for that combination immediately
-                    if self.displayed_prompts:
-                        next_prompt = self.displayed_prompts[-1]
-                        next_target_parts = set(next_prompt["hotkey"].split('+'))
-                        current_parts = set(self._normalize_hotkey(self.current_keys).split('+'))
-                        
-                        # If any of the currently held keys are part of the next target
-                        if any(part in next_target_parts for part in current_parts):
-                            self.waiting_for_combination = True
-                            self.target_hotkey_parts = next_target_parts
-                            self.wrong_attempt = False
-                            self._update_display()
-            
-            return True  # Don't suppress if key was processed
+        def on_key_event(event):
+            # Runs on the keyboard hook thread: only queue the raw event so the
+            # OS gets the key back immediately, all processing happens in Tk
+            if not self.input_active:
+                return True  # Don't suppress if not focused or in a dialog
+            try:
+                self.key_events.put_nowait((time.perf_counter_ns(), event.event_type, event.name, event.scan_code))
+            except queue.Full:
+                self.key_events_dropped = True
+            return True  # Don't suppress
+        
+        if self.selective_hooks:
+            scan_codes = self._deck_scan_codes()
+            if scan_codes is not None:
+                # Only the deck's keys reach Python, all other keys pass straight through
+                keyboard.hook_key(tuple(sorted(scan_codes)), on_key_event)
+                return
         
-        def on_key_up(event):
-            # Only process if main window is focused and not in a dialog
-            if not self.root.focus_displayof() or any(w.winfo_exists() for w in self.root.winfo_children() if isinstance(w, tk.Toplevel)):
-                return True  # Don't suppress if not focused
-            
-            # Only remove the key from current_keys, no display updates
-            normalized_key = self._normalize_key(event.name)
-            if normalized_key in self.current_keys:
-                self.current_keys.remove(normalized_key)
+        keyboard.on_press(on_key_event, suppress=True)
+        keyboard.on_release(on_key_event, suppress=True)
+    
+    def _deck_scan_codes(self):
+        """Collect the scan codes of all keys used by the loaded prompts.
+        
+        Sequence groups only reference prompts by name, so their keys are
+        covered by the prompts. Returns None if a key can't be mapped to a
+        scan code on this platform.
+        """
+        keys = set(keymap.MODIFIERS)  # Always track modifiers for the held key state
+        for hotkey in self.engine.prompts.hotkeys():
+            keys.update(keymap.split_hotkey(hotkey))
+        
+        scan_codes = set()
+        for key in keys:
+            key_codes = keymap.key_scan_codes(key, keyboard.key_to_scan_codes)
+            if not key_codes:
+                return None
+            scan_codes.update(key_codes)
+        return scan_codes
+    
+    def _set_main_window_focused(self, focused):
+        self.main_window_focused = focused
+        self._update_input_gate()
+    
+    def _register_dialog(self, window):
+        """Count a Toplevel as open until it is destroyed."""
+        def on_destroy(event):
+            if event.widget is window:  # Ignore Destroy events of child widgets
+                self._dialog_closed()
+        
+        self._dialog_opened()
+        window.bind('<Destroy>', on_destroy, add='+')
+    
+    def _dialog_opened(self):
+        self.open_dialogs += 1
+        self._update_input_gate()
+    
+    def _dialog_closed(self):
+        self.open_dialogs -= 1
+        self._update_input_gate()
+    
+    def _update_input_gate(self):
+        """Recompute whether key events should be processed."""
+        active = self.main_window_focused and not self.open_dialogs
+        if active and not self.input_active:
+            # Keys may have been released while we weren't listening
+            self.engine.reset_keys()
+        self.input_active = active
+        self._schedule_hook_update()
+    
+    def _schedule_hook_update(self):
+        """Install or remove the global hooks once focus has settled."""
+        if self.hook_update_job is not None:
+            self.root.after_cancel(self.hook_update_job)
+        self.hook_update_job = self.root.after(HOOK_DEBOUNCE_MS, self._apply_hook_state)
+    
+    def _apply_hook_state(self):
+        self.hook_update_job = None
+        if self.input_active:
+            self._install_hooks()
+        else:
+            self._remove_hooks()
+    
+    def _install_hooks(self):
+        """Install the global keyboard hooks if they aren't already."""
+        if self.hooks_installed:
+            return
+        start = time.perf_counter_ns()
+        self._load_keyboard_listener()
+        self.hooks_installed = True
+        self.hook_stats["installs"] += 1
+        self.hook_stats["install_ns"] += time.perf_counter_ns() - start
+    
+    def _remove_hooks(self):
+        """Remove the global keyboard hooks if they are installed."""
+        if not self.hooks_installed:
+            return
+        start = time.perf_counter_ns()
+        keyboard.unhook_all()
+        self.hooks_installed = False
+        self.hook_stats["removals"] += 1
+        self.hook_stats["removal_ns"] += time.perf_counter_ns() - start
+    
+    def _hook_report(self):
+        """Summarize how often the hooks were installed/removed and the time spent."""
+        stats = self.hook_stats
+        return (f"Hooks installed {stats['installs']}x ({stats['install_ns'] / 1e6:.2f} ms), "
+                f"removed {stats['removals']}x ({stats['removal_ns'] / 1e6:.2f} ms)")
+    
+    def _process_key_events(self):
+        """Drain queued key events in batches on the Tk thread."""
+        try:
+            if self.key_events_dropped:
+                # Events were lost, so the held key state can't be trusted anymore
+                self.key_events_dropped = False
+                self.engine.reset_keys()
             
-            return True  # Don't suppress key up events
-        
-        keyboard.on_press(on_key_down, suppress=True)
-        keyboard.on_release(on_key_up, suppress=True)
+            for _ in range(KEY_EVENT_BATCH_SIZE):
+                try:
+                    timestamp, event_type, name, scan_code = self.key_events.get_nowait()
+                except queue.Empty:
+                    break
+                if not self.input_active:
+                    continue  # Discard events queued before focus moved away
+                if self.trace_recorder:
+                    self.trace_recorder.record(timestamp, event_type, name, scan_code)
+                if event_type == keyboard.KEY_DOWN:
+                    self._on_key_down(name, scan_code, timestamp)
+                else:
+                    self._on_key_up(name, scan_code)
+        finally:
+            # Come back right away if a burst is still waiting in the queue,
+            # otherwise use the idle time to sample upcoming prompts
+            if not self.key_events.empty():
+                delay = 0
+            else:
+                delay = KEY_EVENT_POLL_MS
+                if self.engine.prefetch() and self.trace_recorder:
+                    self.trace_recorder.record_prefetch(time.perf_counter_ns())
+            self.root.after(delay, self._process_key_events)
+    
+    def _on_key_down(self, name, scan_code, timestamp):
+        """Handle a key press taken from the event queue."""
+        changes = self.engine.key_down(keymap.event_key_bit(scan_code, name), timestamp)
+        self._schedule_render(changes & (KEYS_CHANGED | STACK_CHANGED))
+    
+    def _on_key_up(self, name, scan_code):
+        """Handle a key release taken from the event queue."""
+        # Only remove the key from the held keys, no display updates
+        self.engine.key_up(keymap.event_key_bit(scan_code, name))
     
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            # Don't lose edits still waiting for the autosave delay
+            if self.config_dirty and self._can_save():
+                self.save_writer.submit(self.current_config_file, self._config_snapshot())
+            self.save_writer.close()
+            if self.journal:
+                self.journal.close()
+            if self.history:
+                self.history.close()
+            if self.trace_recorder:
+                self.trace_recorder.close()
 
 if __name__ == "__main__":
-    app = HotkeyTrainer()
+    parser = argparse.ArgumentParser(description="Hotkey Trainer")
+    parser.add_argument("--record-trace", metavar="PATH",
+                        help="record every processed key event to a binary trace (see keytrace.py)")
+    parser.add_argument("--canvas-stack", action="store_true",
+                        help=f"draw the prompts on a single canvas, allows up to {MAX_CANVAS_ROWS} visible prompts")
+    args = parser.parse_args()
+    app = HotkeyTrainer(trace_path=args.record_trace, canvas_stack=args.canvas_stack)
     app.run()
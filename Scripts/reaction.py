@@ -0,0 +1,68 @@
+"""Per-prompt reaction time statistics.
+
+Reaction times are tracked as an exponentially weighted moving average and
+variance per prompt name, plus a slower moving baseline over all prompts.
+A prompt that is answered slowly (or erratically) compared to the baseline
+gets a weight factor above 1 so it is drilled more often, even if the answers
+are correct.
+
+Factors are computed against a reference that follows the baseline in steps
+of REFERENCE_STEP, not the baseline itself. Otherwise every answer would
+change the factor of every prompt; this way record() says when they changed.
+The baseline averages over a few hundred answers and the step is wide, so
+ordinary noise doesn't move the reference, only a lasting change of pace.
+"""
+import math
+
+ALPHA = 0.3  # Weight of the newest sample in a prompt's average
+BASELINE_ALPHA = 0.01  # Weight of the newest sample in the deck-wide baseline
+MAX_REACTION_NS = 10_000_000_000  # Longer pauses mean the user was away, not slow
+MIN_FACTOR = 0.5
+MAX_FACTOR = 3.0
+REFERENCE_STEP = 0.2  # Relative baseline drift after which all factors are recomputed
+
+
+class ReactionTimes:
+    def __init__(self):
+        self.stats = {}  # Prompt name -> [mean, variance, samples], in ns
+        self.baseline = None  # Moving average over all prompts, in ns
+        self.reference = None  # Baseline the factors are computed against, in ns
+
+    def record(self, name, reaction_ns):
+        """Add one reaction time sample for a prompt.
+
+        Returns True if the reference moved, which changes the factor of
+        every prompt with samples, not just this one.
+        """
+        sample = min(reaction_ns, MAX_REACTION_NS)
+        stat = self.stats.get(name)
+        if stat is None:
+            self.stats[name] = [float(sample), 0.0, 1]
+        else:
+            diff = sample - stat[0]
+            increment = ALPHA * diff
+            stat[0] += increment
+            stat[1] = (1 - ALPHA) * (stat[1] + diff * increment)
+            stat[2] += 1
+
+        if self.baseline is None:
+            self.baseline = float(sample)
+        else:
+            self.baseline += BASELINE_ALPHA * (sample - self.baseline)
+        if self.reference is None or abs(self.baseline - self.reference) > REFERENCE_STEP * self.reference:
+            self.reference = self.baseline
+            return True
+        return False
+
+    def mean(self, name):
+        """Average reaction time of a prompt in ns, or None without samples."""
+        stat = self.stats.get(name)
+        return stat[0] if stat else None
+
+    def factor(self, name):
+        """Weight factor of a prompt: slow or erratic answers compared to the baseline raise it."""
+        stat = self.stats.get(name)
+        if stat is None or not self.reference:
+            return 1.0
+        slow = stat[0] + math.sqrt(stat[1])
+        return min(MAX_FACTOR, max(MIN_FACTOR, slow / self.reference))
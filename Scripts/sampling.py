@@ -0,0 +1,213 @@
+"""Weighted random sampling structures used for prompt selection."""
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
+
+try:
+    import numpy
+except ImportError:  # Optional, batches fall back to random.choices
+    numpy = None
+
+REBUILD_INTERVAL = 100000  # Rebuild the tree after this many updates to drop float drift
+REBUILD_SHRINK = 1e-6  # Rebuild once the total fell below this share of the total at build time
+PREFETCH_BATCH_SIZE = 256  # Number of slots drawn per batch
+PREFETCH_LOW_WATER = 32  # Draw a new batch when fewer slots than this are left
+# Smaller decks draw straight from the tree: it is cheap there, and their batches
+# would be dropped for drift after a few answers
+PREFETCH_MIN_SLOTS = 1024
+PREFETCH_DRIFT_LIMIT = 0.1  # Drop the batch once weights moved by this share of the total
+
+
+def batch_sample(weights, count, rng):
+    """Draw count slot indices by weight in one go (with replacement).
+
+    Uses cumulative weights and a vectorized searchsorted when NumPy is
+    available. The NumPy generator is seeded from rng so seeded runs stay
+    reproducible.
+    """
+    if numpy is not None:
+        cumulative = numpy.cumsum(numpy.asarray(weights, dtype=float))
+        if not len(cumulative) or cumulative[-1] <= 0:
+            return []
+        generator = numpy.random.default_rng(rng.getrandbits(64))
+        draws = generator.random(count) * cumulative[-1]
+        indexes = numpy.searchsorted(cumulative, draws, side="right")
+        return numpy.minimum(indexes, len(cumulative) - 1).tolist()
+
+    cumulative = list(accumulate(weights))
+    if not cumulative or cumulative[-1] <= 0:
+        return []
+    total = cumulative[-1]
+    last = len(cumulative) - 1
+    return [min(bisect_right(cumulative, rng.random() * total), last) for _ in range(count)]
+
+
+class FenwickSampler:
+    """Weighted sampler over a list of slots.
+
+    Keeps the weights in a Fenwick (binary indexed) tree so changing one
+    weight, drawing one index and adding a slot are all O(log N).
+    """
+
+    def __init__(self, weights=()):
+        self.weights = [float(w) for w in weights]
+        self._build()
+
+    def _build(self):
+        n = len(self.weights)
+        tree = [0.0] + self.weights
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.top = 1 << (n.bit_length() - 1) if n else 0  # Highest power of two <= n
+        self.updates = 0
+        # Rounding errors scale with the largest sums the tree has seen, so
+        # once the weights decayed far below them the tree must be rebuilt
+        self.rebuild_below = sum(self.weights) * REBUILD_SHRINK
+
+    def __len__(self):
+        return len(self.weights)
+
+    def append(self, weight):
+        """Add a slot at the end, O(log N)."""
+        weight = float(weight)
+        i = len(self.weights) + 1
+        # The new node covers the slots (i - lowbit(i), i], all but itself already in the tree
+        self.tree.append(weight + self.prefix_total(i - 1) - self.prefix_total(i - (i & -i)))
+        self.weights.append(weight)
+        self.top = 1 << (i.bit_length() - 1)
+
+    def pop(self):
+        """Remove the last slot. Returns its weight."""
+        weight = self.weights.pop()
+        self.tree.pop()  # No other node covers the last slot
+        n = len(self.weights)
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+        return weight
+
+    def update(self, index, weight):
+        """Set the weight of one slot."""
+        weight = float(weight)
+        delta = weight - self.weights[index]
+        if not delta:
+            return
+        self.weights[index] = weight
+        tree = self.tree
+        n = len(self.weights)
+        i = index + 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+        self.updates += 1
+        if self.updates >= REBUILD_INTERVAL:
+            self._build()
+
+    def prefix_total(self, count):
+        """Sum of the weights of the first count slots."""
+        tree = self.tree
+        total = 0.0
+        i = count
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def total(self):
+        return self.prefix_total(len(self.weights))
+
+    def find(self, value):
+        """Return the slot whose cumulative weight range contains value."""
+        tree = self.tree
+        n = len(self.weights)
+        position = 0
+        step = self.top
+        while step:
+            nxt = position + step
+            if nxt <= n and tree[nxt] <= value:
+                position = nxt
+                value -= tree[nxt]
+            step >>= 1
+        return position
+
+    def sample(self, rng, start=0):
+        """Draw one slot index by weight, optionally only among the slots from start on.
+
+        Returns None if there is nothing with a positive weight to draw.
+        """
+        total = self.total()
+        if total < self.rebuild_below:
+            self._build()
+            total = self.total()
+        offset = self.prefix_total(start) if start else 0.0
+        total -= offset
+        if total <= 0:
+            return None
+        index = self.find(offset + rng.random() * total)
+        # Rounding can push the search out of range or onto an empty slot
+        last = len(self.weights) - 1
+        index = min(max(index, start), last)
+        while index > start and self.weights[index] <= 0:
+            index -= 1
+        while index < last and self.weights[index] <= 0:
+            index += 1
+        return index
+
+    def sample_excluding(self, rng, exclude, start=0):
+        """Draw one slot by weight, never one of the slots in exclude.
+
+        The excluded slots are zeroed for the draw and restored afterwards,
+        which is O(len(exclude) log N). Drawing slot by slot while adding each
+        result to exclude samples without replacement.
+        """
+        saved = [(index, self.weights[index]) for index in exclude if self.weights[index] > 0]
+        for index, weight in saved:
+            self.update(index, 0.0)
+        try:
+            return self.sample(rng, start=start)
+        finally:
+            for index, weight in saved:
+                self.update(index, weight)
+
+
+class PrefetchQueue:
+    """Upcoming sampler slots drawn in batches ahead of time.
+
+    The batch reflects the weights at the time it was drawn. Weight changes
+    are accumulated and the batch is dropped once they add up to more than
+    PREFETCH_DRIFT_LIMIT of the total weight.
+    """
+
+    def __init__(self):
+        self.slots = deque()
+        self.total = 0.0  # Total weight of the snapshot the batch was drawn from
+        self.drift = 0.0  # Weight change since the batch was drawn
+
+    def __len__(self):
+        return len(self.slots)
+
+    def needs_fill(self, slot_count):
+        """Whether a batch is worth drawing for a sampler with slot_count slots."""
+        return slot_count >= PREFETCH_MIN_SLOTS and len(self.slots) < PREFETCH_LOW_WATER
+
+    def fill(self, weights, rng):
+        """Replace the queue with a fresh batch drawn from weights."""
+        self.slots = deque(batch_sample(weights, PREFETCH_BATCH_SIZE, rng))
+        self.total = sum(weights)
+        self.drift = 0.0
+
+    def pop(self):
+        """Return the next prefetched slot, or None if the queue is empty."""
+        return self.slots.popleft() if self.slots else None
+
+    def weight_changed(self, old_weight, new_weight):
+        if not self.slots:
+            return
+        self.drift += abs(new_weight - old_weight)
+        if self.drift > PREFETCH_DRIFT_LIMIT * self.total:
+            self.clear()
+
+    def clear(self):
+        self.slots.clear()
+        self.drift = 0.0
@@ -0,0 +1,145 @@
+"""Spaced repetition scheduling of prompts and sequence groups.
+
+SM-2 style: every unit (a single prompt or a whole sequence group) has a
+stability (how many reviews until it should come back), an ease factor and a
+due time. Units waiting to be shown sit in a heap ordered by due time, so
+picking the next one is O(log N) and never looks at the rest of the deck.
+The clock counts reviews instead of wall time, which keeps sessions, replays
+and benchmarks deterministic.
+
+Units never seen before are introduced one every NEW_UNIT_SPACING reviews, in
+shuffled order, so reviews (a missed prompt is due after one more review) are
+mixed in instead of waiting behind the whole rest of the deck.
+"""
+import heapq
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+EASE_BONUS = 0.1  # Added to the ease after a clean review
+EASE_PENALTY = 0.2  # Taken from the ease after a review with mistakes
+NEW_UNIT_SPACING = 3  # Reviews between two units shown for the first time
+
+
+class UnitState:
+    __slots__ = ("stability", "ease", "reps", "due")
+
+    def __init__(self, due):
+        self.stability = 0  # Reviews until the unit is due again
+        self.ease = INITIAL_EASE
+        self.reps = 0  # Clean reviews in a row
+        self.due = due
+
+
+class SpacedRepetitionScheduler:
+    def __init__(self, rng=None):
+        self.rng = rng  # Shuffles new units, they come in deck order without one
+        self.clock = 0  # Number of reviews so far
+        self.next_new = 0  # Earliest due time of the next new unit
+        self.states = {}  # Unit key -> UnitState
+        self.heap = []  # (due, order, key) of units waiting to be shown
+        self.queued = {}  # Unit key -> order of its live heap entry, other entries are stale
+        self.in_flight = set()  # Units handed out and not reviewed yet
+        self.order = 0  # Tie breaker, units due at the same time come back in order
+
+    def set_units(self, keys):
+        """Schedule exactly these units, keeping the state of units already known."""
+        keys = list(keys)
+        known = set(keys)
+        self.states = {key: state for key, state in self.states.items() if key in known}
+        self.in_flight &= known
+        new_keys = [key for key in keys if key not in self.states]
+        if self.rng:
+            self.rng.shuffle(new_keys)
+        for key in new_keys:
+            self.states[key] = self._new_state()
+        self.heap = []
+        self.queued = {}
+        for key in keys:
+            if key not in self.in_flight:
+                order = self.queued[key] = self._next_order()
+                self.heap.append((self.states[key].due, order, key))
+        heapq.heapify(self.heap)
+
+    def add_unit(self, key):
+        """Schedule one more unit, due after the new units already waiting."""
+        if key not in self.states:
+            self.states[key] = self._new_state()
+            self._push(key)
+
+    def remove_unit(self, key):
+        """Stop scheduling a unit. Its heap entry is dropped lazily by next_unit."""
+        self.states.pop(key, None)
+        self.queued.pop(key, None)
+        self.in_flight.discard(key)
+
+    def _new_state(self):
+        due = max(self.next_new, self.clock)
+        self.next_new = due + NEW_UNIT_SPACING
+        return UnitState(due)
+
+    def save(self):
+        """State worth keeping: (clock, {unit key: (stability, ease, reps, due)})."""
+        return self.clock, {key: (state.stability, state.ease, state.reps, state.due)
+                            for key, state in self.states.items()}
+
+    def restore(self, clock, units):
+        """Continue from a saved state, set_units must be called afterwards."""
+        self.clock = clock
+        self.next_new = clock
+        self.states = {}
+        for key, (stability, ease, reps, due) in units.items():
+            state = self.states[key] = UnitState(due)
+            state.stability, state.ease, state.reps = stability, ease, reps
+
+    def _next_order(self):
+        self.order += 1
+        return self.order
+
+    def _push(self, key):
+        order = self.queued[key] = self._next_order()
+        heapq.heappush(self.heap, (self.states[key].due, order, key))
+
+    def next_unit(self):
+        """Hand out the unit that is due first, or None if every unit is out."""
+        while self.heap:
+            due, order, key = heapq.heappop(self.heap)
+            if self.queued.get(key) == order:
+                del self.queued[key]
+                self.in_flight.add(key)
+                return key
+        return None
+
+    def put_back(self, key):
+        """Return a handed out unit without reviewing it."""
+        if key in self.in_flight:
+            self.in_flight.discard(key)
+            self._push(key)
+
+    def release_all(self):
+        """Return every handed out unit, e.g. when the visible stack is reset."""
+        for key in list(self.in_flight):
+            self.put_back(key)
+
+    def review(self, key, correct):
+        """Reschedule a handed out unit after it was answered, returns whether it was handed out."""
+        if key not in self.in_flight:
+            return False
+        self.in_flight.discard(key)
+        self.clock += 1
+        state = self.states[key]
+        if correct:
+            state.reps += 1
+            if state.reps == 1:
+                state.stability = 1
+            elif state.reps == 2:
+                state.stability = 3
+            else:
+                state.stability = round(state.stability * state.ease)
+            state.ease += EASE_BONUS
+        else:
+            state.reps = 0
+            state.stability = 1
+            state.ease = max(MIN_EASE, state.ease - EASE_PENALTY)
+        state.due = self.clock + state.stability
+        self._push(key)
+        return True
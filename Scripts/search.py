@@ -0,0 +1,168 @@
+"""Incremental search over prompt names and hotkeys for the Settings window.
+
+Every prompt is searchable by "name<TAB>canonical hotkey" in lower case.
+Queries of NGRAM characters or more match anywhere in that text: the index
+maps each trigram to the prompts containing it, and only the prompts of the
+query's rarest trigram are checked. Shorter queries match the start of a
+word, found by bisecting a sorted word list. When typing on (the new query
+contains the previous one), the previous result is checked instead if it is
+smaller.
+
+Removed prompts are dropped lazily: postings keep their ID until the index
+is compacted, and results are checked against the live texts.
+
+Building the index for a big deck takes a while, IndexBuild does it on a
+worker thread; scan() answers queries the slow way until it is done.
+"""
+from bisect import bisect_left, insort
+import re
+import threading
+
+import keymap
+
+NGRAM = 3
+_WORD_SPLIT = re.compile(r"[\s+\-_.,:;/()]+")
+
+
+def search_text(prompt):
+    """The text a prompt is found by."""
+    return f"{prompt['name'].lower()}\t{keymap.canonical_hotkey(prompt['hotkey'])}"
+
+
+def scan(prompts, query):
+    """IDs of the prompts matching query like PromptIndex.search would find them, without an index."""
+    query = query.lower().strip()
+    hotkeys = {}  # Decks repeat hotkeys a lot, canonicalize each one once
+    found = []
+    for prompt in prompts:
+        hotkey = hotkeys.get(prompt["hotkey"])
+        if hotkey is None:
+            hotkey = hotkeys[prompt["hotkey"]] = keymap.canonical_hotkey(prompt["hotkey"])
+        if _matches(f"{prompt['name'].lower()}\t{hotkey}", query):
+            found.append(prompt["id"])
+    return found
+
+
+def _matches(text, query):
+    # Short queries match the start of a word, longer ones anywhere
+    if len(query) < NGRAM:
+        return any(word.startswith(query) for word in _WORD_SPLIT.split(text) if word)
+    return query in text
+
+
+def _grams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class PromptIndex:
+    def __init__(self):
+        self.texts = {}  # Prompt ID -> search text of the live prompts
+        self.grams = {}  # Trigram -> prompt IDs in insertion order, may include removed IDs
+        self.words = []  # Sorted (word, prompt ID) pairs, may include removed IDs
+        self.stale = 0  # Removed IDs still referenced by the postings
+        self.last_query = None
+        self.last_result = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def rebuild(self, prompts):
+        """Index exactly these prompts."""
+        self.texts = {prompt["id"]: search_text(prompt) for prompt in prompts}
+        self._build()
+
+    def _build(self):
+        self.grams = {}
+        words = []
+        for prompt_id, text in self.texts.items():
+            for gram in _grams(text):
+                self.grams.setdefault(gram, []).append(prompt_id)
+            for word in set(_WORD_SPLIT.split(text)):
+                if word:
+                    words.append((word, prompt_id))
+        words.sort()
+        self.words = words
+        self.stale = 0
+        self._forget_last()
+
+    def add(self, prompt):
+        text = self.texts[prompt["id"]] = search_text(prompt)
+        for gram in _grams(text):
+            self.grams.setdefault(gram, []).append(prompt["id"])
+        for word in set(_WORD_SPLIT.split(text)):
+            if word:
+                insort(self.words, (word, prompt["id"]))
+        self._forget_last()
+
+    def remove(self, prompt_id):
+        if self.texts.pop(prompt_id, None) is None:
+            return
+        self.stale += 1
+        if self.stale > len(self.texts):
+            self._build()  # Most postings point at removed prompts
+
+    def search(self, query):
+        """IDs of the prompts matching query."""
+        query = query.lower().strip()
+        if not query:
+            return list(self.texts)
+
+        texts = self.texts
+        if len(query) < NGRAM:
+            result = set()
+            start = bisect_left(self.words, (query,))
+            for word, prompt_id in self.words[start:]:
+                if not word.startswith(query):
+                    break
+                if prompt_id in texts:
+                    result.add(prompt_id)
+            result = sorted(result)
+        else:
+            postings = [self.grams.get(gram, ()) for gram in _grams(query)]
+            last = self.last_query
+            if last is not None and len(last) >= NGRAM and last in query:
+                postings.append(self.last_result)
+            candidates = min(postings, key=len)
+            result = [prompt_id for prompt_id in candidates if query in texts.get(prompt_id, "")]
+
+        self.last_query = query
+        self.last_result = result
+        return result
+
+    def _forget_last(self):
+        self.last_query = None
+        self.last_result = None
+
+
+class IndexBuild:
+    """Builds a PromptIndex of a prompt snapshot on a worker thread.
+
+    Prompts added or removed meanwhile are noted with add() and remove() and
+    applied to the index by result() once the build is done.
+    """
+
+    def __init__(self, prompts):
+        self.index = PromptIndex()
+        self.edits = []  # (added, prompt or prompt ID) in order
+        self.thread = threading.Thread(target=self.index.rebuild, args=(prompts,),
+                                       name="search-index", daemon=True)
+        self.thread.start()
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def add(self, prompt):
+        self.edits.append((True, prompt))
+
+    def remove(self, prompt_id):
+        self.edits.append((False, prompt_id))
+
+    def result(self):
+        """The finished index, call once done() is True."""
+        for added, item in self.edits:
+            if added:
+                self.index.add(item)
+            else:
+                self.index.remove(item)
+        self.edits = []
+        return self.index
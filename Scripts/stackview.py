@@ -0,0 +1,177 @@
+"""Widgets that draw the visible prompt stack.
+
+The trainer describes the stack as a list of rows, (text, active, wrong)
+tuples from top to bottom, and hands it to render(). The view remembers what
+is on screen and only reconfigures the widgets of rows that changed, so a
+keystroke costs the same no matter how many prompts are visible.
+"""
+import time
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+
+ACTIVE_BACKGROUND = "#e6f3ff"  # Light blue background of the active prompt
+MAX_CANVAS_ROWS = 40  # Visible prompt limit of the canvas stack
+BLANK_ROW = ("", False, False)
+
+
+class RenderStats:
+    """Time spent in render() calls, in ns."""
+
+    def __init__(self):
+        self.renders = 0
+        self.total_ns = 0
+        self.last_ns = 0
+        self.max_ns = 0
+
+    def add(self, elapsed_ns):
+        self.renders += 1
+        self.total_ns += elapsed_ns
+        self.last_ns = elapsed_ns
+        self.max_ns = max(self.max_ns, elapsed_ns)
+
+    def report(self):
+        if not self.renders:
+            return "No redraws yet"
+        average = self.total_ns / self.renders / 1000
+        return (f"{self.renders} redraws, avg {average:.0f} µs, "
+                f"last {self.last_ns / 1000:.0f} µs, max {self.max_ns / 1000:.0f} µs")
+
+
+class PromptStackView:
+    """Prompt stack made of one pre-created frame, label and indicator per row.
+
+    Rows are only packed or unpacked when the number of visible prompts
+    changes. A shorter stack is padded with blank rows at the top, so the
+    active prompt stays at the bottom.
+    """
+
+    def __init__(self, parent, max_rows):
+        self.max_rows = max_rows
+        self.frame = ttk.Frame(parent)
+        self.stats = RenderStats()
+        self.row_count = 0  # Number of packed rows
+        self.shown = [BLANK_ROW] * max_rows  # What each row's widgets currently show
+        self.row_widgets = []
+        for _ in range(max_rows):
+            frame = ttk.Frame(self.frame)
+
+            # Create a horizontal container for the prompt and indicator
+            content_frame = ttk.Frame(frame)
+            content_frame.pack(fill=tk.X, expand=True)
+
+            # Add the prompt text label with fixed width
+            label = ttk.Label(content_frame, width=50, anchor="w")
+            label.pack(side=tk.LEFT)
+
+            # The indicator keeps its space, the dot is only hidden
+            canvas = tk.Canvas(content_frame, width=10, height=10, highlightthickness=0)
+            canvas.pack(side=tk.LEFT, padx=5)
+            dot = canvas.create_oval(2, 2, 8, 8, fill='red', outline='red', state=tk.HIDDEN)
+
+            # Disable focus and tab navigation for prompt widgets
+            for widget in (frame, content_frame, label, canvas):
+                widget.configure(takefocus=0)
+
+            self.row_widgets.append({
+                'frame': frame,
+                'label': label,
+                'indicator': canvas,
+                'dot': dot
+            })
+
+    def render(self, rows, row_count):
+        """Show rows (top to bottom) in a stack of row_count rows."""
+        start = time.perf_counter_ns()
+        if row_count != self.row_count:
+            self._set_row_count(row_count)
+        rows = rows[-row_count:]
+        rows = [BLANK_ROW] * (row_count - len(rows)) + list(rows)
+
+        for i, row in enumerate(rows):
+            old = self.shown[i]
+            if row == old:
+                continue
+            widgets = self.row_widgets[i]
+            text, active, wrong = row
+            if text != old[0]:
+                widgets['label'].configure(text=text)
+            if active != old[1]:
+                widgets['frame'].configure(style="Active.TFrame" if active else "TFrame")
+                widgets['label'].configure(background=ACTIVE_BACKGROUND if active else "")
+            if wrong != old[2]:
+                widgets['indicator'].itemconfigure(widgets['dot'], state=tk.NORMAL if wrong else tk.HIDDEN)
+            self.shown[i] = row
+        self.stats.add(time.perf_counter_ns() - start)
+
+    def _set_row_count(self, row_count):
+        """Pack exactly row_count rows, the only geometry change of the view."""
+        for widgets in self.row_widgets[self.row_count:row_count]:
+            widgets['frame'].pack(fill=tk.X, pady=2)
+        for widgets in self.row_widgets[row_count:self.row_count]:
+            widgets['frame'].pack_forget()
+        self.row_count = row_count
+
+
+class CanvasPromptStack:
+    """Prompt stack drawn as items on a single canvas.
+
+    Each row is a background rectangle, a text item and a dot. Rendering only
+    changes item text, fill and state, and the canvas is resized only when
+    the number of visible prompts changes. Without a widget per row, stacks
+    far taller than PromptStackView's are cheap.
+    """
+
+    def __init__(self, parent, max_rows, text_width=50):
+        self.max_rows = max_rows
+        self.stats = RenderStats()
+        font = tkfont.nametofont("TkDefaultFont")
+        self.row_height = font.metrics("linespace") + 4
+        self.text_width = font.measure("0") * text_width
+        background = ttk.Style().lookup("TFrame", "background") or None
+        self.frame = tk.Canvas(parent, width=self.text_width + 20, height=0,
+                               highlightthickness=0, takefocus=0, background=background)
+        self.row_count = 0  # Number of rows the canvas is sized for
+        self.shown = []  # What each row's items currently show
+        self.row_items = []  # (background, text, dot) item ids of each row created so far
+
+    def render(self, rows, row_count):
+        """Show rows (top to bottom) in a stack of row_count rows."""
+        start = time.perf_counter_ns()
+        if row_count != self.row_count:
+            self._set_row_count(row_count)
+        rows = rows[-row_count:]
+        rows = [BLANK_ROW] * (row_count - len(rows)) + list(rows)
+
+        canvas = self.frame
+        for i, row in enumerate(rows):
+            old = self.shown[i]
+            if row == old:
+                continue
+            background, text_item, dot = self.row_items[i]
+            text, active, wrong = row
+            if text != old[0]:
+                canvas.itemconfigure(text_item, text=text)
+            if active != old[1]:
+                canvas.itemconfigure(background, fill=ACTIVE_BACKGROUND if active else "")
+            if wrong != old[2]:
+                canvas.itemconfigure(dot, state=tk.NORMAL if wrong else tk.HIDDEN)
+            self.shown[i] = row
+        self.stats.add(time.perf_counter_ns() - start)
+
+    def _set_row_count(self, row_count):
+        """Resize the canvas to row_count rows, creating row items the first time they are needed."""
+        canvas = self.frame
+        while len(self.row_items) < row_count:
+            top = len(self.row_items) * self.row_height
+            middle = top + self.row_height // 2
+            self.row_items.append((
+                canvas.create_rectangle(0, top, self.text_width + 20, top + self.row_height,
+                                        fill="", outline=""),
+                canvas.create_text(2, middle, anchor="w", text="", font="TkDefaultFont"),
+                canvas.create_oval(self.text_width + 7, middle - 3, self.text_width + 13, middle + 3,
+                                   fill='red', outline='red', state=tk.HIDDEN),
+            ))
+            self.shown.append(BLANK_ROW)
+        canvas.configure(height=row_count * self.row_height)
+        self.row_count = row_count